@@ -0,0 +1,149 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import time
+import traceback
+
+from pydantic import Field, model_validator
+
+from brief import FIELD_LABELS, Brief
+from checkpoints import open_checkpointer, run_config
+from graph import build_graph, stream_run
+from instrumentation import get_instrumentation, instrumented_config
+from rate_limit import BATCH, priority
+from tools.web import close_web_clients
+
+DEFAULT_CONCURRENCY = 8
+
+
+class BrandBrief(Brief):
+    id: str | None = Field(default=None, description='Identifier echoed back in the results.')
+    website_links: list[str] = Field(description='Brand website URLs to research.')
+    requirements: str | None = Field(default=None, min_length=1, description='Pre-filled brand details: name, budget, goals.')
+
+    @model_validator(mode='after')
+    def check_details(self):
+        # there is nobody to interview in a batch
+        if not self.requirements and not self.complete:
+            missing = ', '.join(FIELD_LABELS[name] for name in self.missing)
+            raise ValueError(f'requirements are needed when the brief has no {missing}')
+        return self
+
+
+def load_briefs(path: str) -> list[BrandBrief]:
+    '''Reads briefs from a JSON list or a JSON Lines file.'''
+    with open(path, encoding='utf-8') as file:
+        content = file.read().strip()
+    if content.startswith('['):
+        records = json.loads(content)
+    else:
+        records = [json.loads(line) for line in content.splitlines() if line.strip()]
+    briefs = []
+    for record in records:
+        brief = BrandBrief(**record)
+        if brief.id is None:
+            # stable across reruns so checkpoints of the same brief are found again
+            key = [brief.website_links, brief.requirements]
+            fields = Brief.model_validate(brief.model_dump())
+            if fields != Brief():
+                key.append(fields.model_dump())
+            content_key = json.dumps(key).encode('utf-8')
+            brief.id = hashlib.sha1(content_key).hexdigest()[:12]
+        briefs.append(brief)
+    return briefs
+
+
+async def run_brief(brief: BrandBrief, graph, semaphore: asyncio.Semaphore) -> dict:
+    '''Runs one brief to completion; failures are returned, never raised.'''
+    async with semaphore:
+        # batch calls yield to interactive runs sharing the rate limiter
+        with priority(BATCH):
+            started = time.perf_counter()
+            config = run_config(brief.id, instrumented_config(brief.id, {'run_name': f'brief-{brief.id}'}))
+            final_output = None
+            try:
+                async for output in stream_run(graph, brief.model_dump(), config):
+                    for update in output.values():
+                        final_output = (update or {}).get('final_output', final_output)
+                if final_output is None and graph.checkpointer is not None:
+                    final_output = (await graph.aget_state(config)).values.get('final_output')
+            except Exception as error:
+                return {
+                    'id': brief.id,
+                    'status': 'failed',
+                    'error': f'{type(error).__name__}: {error}',
+                    'traceback': traceback.format_exc(),
+                    'duration': time.perf_counter() - started,
+                }
+            nodes = get_instrumentation().handler.summarize(brief.id).values()
+            return {
+                'id': brief.id,
+                'status': 'succeeded',
+                'output': final_output,
+                'duration': time.perf_counter() - started,
+                'tokens': int(sum(n.get('prompt_tokens', 0) + n.get('completion_tokens', 0) for n in nodes)),
+                'cost': sum(n.get('cost', 0) for n in nodes),
+            }
+
+
+async def run_batch(briefs: list[BrandBrief], concurrency: int = DEFAULT_CONCURRENCY, graph=None, graph_options=None):
+    '''Runs briefs concurrently, yielding each result as soon as it completes.
+
+    Runs are checkpointed by brief id, so re-running a batch resumes
+    unfinished briefs and returns finished ones without new calls.
+    '''
+    async with contextlib.AsyncExitStack() as stack:
+        if graph is None:
+            graph = build_graph(
+                checkpointer=await stack.enter_async_context(open_checkpointer()), **(graph_options or {})
+            )
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [asyncio.create_task(run_brief(brief, graph, semaphore)) for brief in briefs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def main(path: str, concurrency: int, results_path: str | None, graph_options: dict | None = None):
+    briefs = load_briefs(path)
+    counts = {'succeeded': 0, 'failed': 0}
+    started = time.perf_counter()
+    results_file = open(results_path, 'a', encoding='utf-8') if results_path else None
+    try:
+        async for result in run_batch(briefs, concurrency, graph_options=graph_options):
+            counts[result['status']] += 1
+            line = json.dumps(result)
+            if results_file:
+                results_file.write(line + '\n')
+                results_file.flush()
+            summary = {key: value for key, value in result.items() if key != 'traceback'}
+            print(f"[{sum(counts.values())}/{len(briefs)}] {json.dumps(summary)}", flush=True)
+    finally:
+        if results_file:
+            results_file.close()
+        await close_web_clients()
+    print(
+        f"Batch finished in {time.perf_counter() - started:.1f}s: "
+        f"{counts['succeeded']} succeeded, {counts['failed']} failed."
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate marketing reports for many brands concurrently.')
+    parser.add_argument('briefs', help='JSON or JSON Lines file of brand briefs.')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum graph runs in flight.')
+    parser.add_argument('--results', help='Append full per-brand results (JSON Lines) to this file.')
+    parser.add_argument('--fan-out', action='store_true', help='Generate strategies per marketing goal in parallel.')
+    parser.add_argument('--speculative-format', action='store_true', help='Format reports while they are quality checked.')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this port while running.')
+    args = parser.parse_args()
+    if args.metrics_port:
+        get_instrumentation().start_metrics_server(args.metrics_port)
+    asyncio.run(main(args.briefs, args.concurrency, args.results, {
+        'fan_out': args.fan_out, 'speculative_format': args.speculative_format,
+    }))
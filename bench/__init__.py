@@ -0,0 +1,2 @@
+'''Offline benchmark harness: the real graph against a fake LLM, fake search
+and local fixture sites. Run with ``python -m bench.run``.'''
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, List
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import tool
+
+from tokens import CHARS_PER_TOKEN, estimate_tokens
+
+# Deterministic stand-ins for the LLM provider and Tavily.
+WORDS = (
+    'brand audience campaign content channel conversion customer engagement funnel growth '
+    'influencer loyalty message offer organic partnership reach retention segment social '
+    'story strategy trust value voice'
+).split()
+SECTIONS = ['Brand Awareness', 'Lead Generation', 'Customer Retention']
+FEEDBACK = f'Make {SECTIONS[0]} more specific to the brand.'
+REVISION_MARKER = re.compile(r'\[revision (\d+)\]')
+STREAM_PIECE = re.compile(r'\S+\s*|\s+')
+URL = re.compile(r'https?://[^\s\'",\]]+')
+
+
+def _filler(seed: str, tokens: int) -> str:
+    '''Repeatable pseudo-text of about tokens tokens, varying with seed.'''
+    digest = hashlib.sha1(seed.encode('utf-8')).digest()
+    words, size, index = [], 0, digest[0]
+    while size < tokens * CHARS_PER_TOKEN:
+        word = WORDS[(index * 7 + digest[index % len(digest)]) % len(WORDS)]
+        words.append(word)
+        size += len(word) + 1
+        index += 1
+    return ' '.join(words)
+
+
+class FakeChatModel(BaseChatModel):
+    '''Chat model that answers every graph prompt without a provider.
+
+    Latency is latency + output_tokens * seconds_per_token. It honours the
+    functions bound by graph.py (router_fn always moves on to the summary,
+    and route asks for revision_rounds brand tuner revisions before FINISH). On
+    its first turn with the research tool bound, it calls the tool on the URLs
+    in the prompt, so the real fetch, crawl, dedup and index path runs.
+    '''
+
+    latency: float = 0.05
+    seconds_per_token: float = 0.0
+    output_tokens: int = 400
+    revision_rounds: int = 1
+    crawl: bool = True
+    summary_route: str = 'SUMMARY'
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat'
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {'output_tokens': self.output_tokens, 'revision_rounds': self.revision_rounds}
+
+    def _function_call(self, name: str, arguments: dict) -> AIMessage:
+        return AIMessage(content='', additional_kwargs={
+            'function_call': {'name': name, 'arguments': json.dumps(arguments)}
+        })
+
+    def _reply(self, messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+        prompt = '\n'.join(str(message.content) for message in messages)
+        function = (kwargs.get('function_call') or {}).get('name')
+        if function == 'router_fn':
+            return self._function_call(function, {'next_requirements': self.summary_route, 'question': ''})
+        if function == 'route':
+            rounds = max([int(n) for n in REVISION_MARKER.findall(prompt)], default=0)
+            if rounds < self.revision_rounds:
+                return self._function_call(function, {
+                    'next': 'brand_tuner_agent',
+                    'feedback': FEEDBACK,
+                    'failed_sections': [SECTIONS[0]],
+                })
+            return self._function_call(function, {'next': 'FINISH', 'feedback': 'Looks good.'})
+
+        tool_names = {spec.get('function', {}).get('name') for spec in kwargs.get('tools') or []}
+        if 'research' in tool_names and not any(isinstance(m, ToolMessage) for m in messages):
+            urls = list(dict.fromkeys(URL.findall(prompt)))
+            return AIMessage(content='', tool_calls=[{
+                'name': 'research', 'args': {'research_urls': urls, 'crawl': self.crawl}, 'id': 'call_research',
+            }])
+
+        # answers to the fake feedback carry a marker the fake quality check counts
+        marker = ''
+        if FEEDBACK in prompt:
+            marker = f'[revision {max([int(n) for n in REVISION_MARKER.findall(prompt)], default=0) + 1}] '
+        share = max(1, self.output_tokens // len(SECTIONS))
+        if 'revise only the sections' in prompt:
+            return AIMessage(content=f'## {SECTIONS[0]}\n{marker}{_filler(prompt, share)}\n')
+        return AIMessage(content=''.join(
+            f'## {section}\n{marker if section == SECTIONS[0] else ""}{_filler(section + prompt, share)}\n\n'
+            for section in SECTIONS
+        ))
+
+    def _result(self, messages: List[BaseMessage], **kwargs: Any) -> ChatResult:
+        message = self._reply(messages, **kwargs)
+        prompt_tokens = estimate_tokens(''.join(str(m.content) for m in messages))
+        completion_tokens = estimate_tokens(str(message.content) or json.dumps(message.additional_kwargs))
+        message.usage_metadata = {
+            'input_tokens': prompt_tokens,
+            'output_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _delay(self) -> float:
+        return self.latency + self.output_tokens * self.seconds_per_token
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._delay())
+        return self._result(messages, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return self._result(messages, **kwargs)
+
+    def _should_stream(self, *, async_api: bool, run_manager=None, **kwargs: Any) -> bool:
+        # as models.RoutedChatModel: only calls a streaming handler asked for
+        kwargs.pop('stream', None)
+        return run_manager is not None and super()._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        '''First token after latency, then one word at a time at seconds_per_token.'''
+        message = self._result(messages, **kwargs).generations[0].message
+        await asyncio.sleep(self.latency)
+        if message.tool_calls or message.additional_kwargs:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=message.content,
+                additional_kwargs=message.additional_kwargs,
+                tool_call_chunks=[
+                    {'name': call['name'], 'args': json.dumps(call['args']), 'id': call['id'], 'index': index}
+                    for index, call in enumerate(message.tool_calls)
+                ],
+                usage_metadata=message.usage_metadata,
+            ))
+            return
+        pieces = STREAM_PIECE.findall(message.content) or ['']
+        for index, piece in enumerate(pieces):
+            await asyncio.sleep(estimate_tokens(piece) * self.seconds_per_token)
+            last = index == len(pieces) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=piece, usage_metadata=message.usage_metadata if last else None
+            ))
+
+
+SEARCH_LATENCY = 0.05
+
+
+@tool('tavily_search_results_json')
+async def fake_search(query: str) -> str:
+    '''A search engine. Useful for when you need to answer questions about current events. Input should be a search query.'''
+    await asyncio.sleep(SEARCH_LATENCY)
+    return json.dumps([
+        {'url': f'https://example.com/insights/{index}', 'content': _filler(f'{query}{index}', 60)}
+        for index in range(3)
+    ])
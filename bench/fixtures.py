@@ -0,0 +1,106 @@
+import asyncio
+import html
+
+from aiohttp import web
+
+# Local stand-ins for brand websites: one server (and so one site) per brand,
+# with robots.txt, a sitemap, shared boilerplate and product pages.
+PRODUCTS_PER_COLLECTION = 6
+COLLECTIONS = ['men', 'women', 'accessories']
+BOILERPLATE = [
+    'Free shipping on all orders above Rs 999. Use code WELCOME for 10% off your first order.',
+    'We use cookies to improve your experience on our website. By continuing you agree to our cookie policy.',
+]
+
+
+def _page(brand: str, title: str, body: list[str], links: list[tuple[str, str]]) -> str:
+    nav = ''.join(f'<a href="{href}">{html.escape(text)}</a>' for href, text in links)
+    paragraphs = ''.join(f'<p>{html.escape(line)}</p>' for line in [*BOILERPLATE, *body])
+    return (
+        f'<html><head><title>{html.escape(title)} | {html.escape(brand)}</title>'
+        '<script>window.analytics = {};</script><style>body { margin: 0 }</style></head>'
+        f'<body><nav>{nav}</nav><main><h1>{html.escape(title)}</h1>{paragraphs}</main>'
+        f'<div class="links">{nav}</div><footer>© {html.escape(brand)}</footer></body></html>'
+    )
+
+
+def brand_site(brand: str) -> dict[str, str]:
+    '''path -> HTML for one fixture brand.'''
+    links = [('/', 'Home'), ('/pages/about-us', 'About us'), ('/cart', 'Cart'), ('/account/login', 'Login')]
+    links += [(f'/collections/{name}', name.title()) for name in COLLECTIONS]
+    pages = {
+        '/': _page(brand, 'Home', [
+            f'{brand} makes officially licensed pop culture apparel for fans.',
+            'New arrivals every week across tees, hoodies and accessories.',
+        ], links),
+        '/pages/about-us': _page(brand, 'About us', [
+            f'{brand} started in 2013 with a simple idea: merch that fans are proud to wear.',
+            'Our mission is to celebrate fandoms with quality products and a playful tone of voice.',
+            'We value community, creativity and sustainability in everything we make.',
+        ], links),
+    }
+    for name in COLLECTIONS:
+        products = [(f'/products/{name}-{index}', f'{name.title()} Tee {index}') for index in range(PRODUCTS_PER_COLLECTION)]
+        pages[f'/collections/{name}'] = _page(
+            brand, f'{name.title()} collection',
+            [f'{title}: oversized cotton t-shirt, Rs {499 + 100 * index}' for index, (_, title) in enumerate(products)],
+            links + products,
+        )
+        for index, (path, title) in enumerate(products):
+            pages[path] = _page(brand, title, [
+                f'{title} is a 240 GSM oversized cotton tee with a {name} fit.',
+                f'Price Rs {499 + 100 * index}. Machine wash cold.',
+            ], links)
+    return pages
+
+
+def fixture_app(brand: str, latency: float = 0.0) -> web.Application:
+    pages = brand_site(brand)
+
+    async def handle(request: web.Request) -> web.Response:
+        if latency:
+            await asyncio.sleep(latency)
+        path = request.path
+        base = f'{request.scheme}://{request.host}'
+        if path == '/robots.txt':
+            return web.Response(text=f'User-agent: *\nDisallow: /account/\nDisallow: /cart\nSitemap: {base}/sitemap.xml\n')
+        if path == '/sitemap.xml':
+            urls = ''.join(f'<url><loc>{base}{page}</loc></url>' for page in pages)
+            return web.Response(
+                text=f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>',
+                content_type='application/xml',
+            )
+        if path in pages:
+            return web.Response(text=pages[path], content_type='text/html')
+        return web.Response(status=404, text='Not found', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_route('GET', '/{tail:.*}', handle)
+    return app
+
+
+class FixtureSites:
+    '''Starts one local server per brand; use as an async context manager.'''
+
+    def __init__(self, brands: list[str], latency: float = 0.0, host: str = '127.0.0.1'):
+        self.brands = brands
+        self.latency = latency
+        self.host = host
+        self.urls: dict[str, str] = {}
+        self._runners: list[web.AppRunner] = []
+
+    async def __aenter__(self) -> 'FixtureSites':
+        for brand in self.brands:
+            runner = web.AppRunner(fixture_app(brand, self.latency), access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, self.host, 0)
+            await site.start()
+            port = runner.addresses[0][1]
+            self._runners.append(runner)
+            self.urls[brand] = f'http://{self.host}:{port}/'
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners.clear()
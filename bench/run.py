@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from bench.fakes import FakeChatModel, fake_search
+from bench.fixtures import FixtureSites
+from graph import build_graph, create_initial_state, guided_json, router_function_def
+from instrumentation import Instrumentation
+from llm_cache import MemoryTier, ResponseCache, get_response_cache, set_response_cache
+from models import RoutedChatModel
+from rate_limit import LIMITS, Budget, RateLimiter, get_rate_limiter, set_rate_limiter
+from speculation import speculation_totals
+from tools.dedup import dedup_totals
+from tools.metrics import fetch_metrics
+from tools.page_cache import PageCache, set_page_cache
+from tools.web import close_web_clients
+
+DEFAULT_RUNS = 8
+DEFAULT_CONCURRENCY = 4
+# rate limiter route of the fake model; unlimited unless --rpm/--tpm are given
+FAKE_ROUTE = 'fake:chat'
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def build_fake_graph(model: FakeChatModel, **graph_options):
+    '''The real graph on the fake model, called through models.RoutedChatModel
+    like a provider model, so the response cache, rate limiter and router run too.'''
+    routed = RoutedChatModel(routes=[model], route_names=[FAKE_ROUTE], cache=get_response_cache())
+    return build_graph(
+        model=routed,
+        requirements_model=routed.bind(functions=[guided_json], function_call={'name': 'router_fn'}),
+        quality_checker_model=routed.bind(functions=[router_function_def], function_call={'name': 'route'}),
+        search_tool=fake_search,
+        **graph_options,
+    )
+
+
+async def run_benchmark(
+    runs: int = DEFAULT_RUNS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    model: FakeChatModel | None = None,
+    site_latency: float = 0.0,
+    graph_options: dict | None = None,
+    trace_memory: bool = False,
+) -> dict:
+    '''Runs the real graph runs times (concurrency at once), one fixture brand site per run.
+
+    Expects fresh caches (see main); returns end-to-end and per-node latency,
+    throughput, peak memory and the web/dedup counters. Peak memory is the
+    process's max RSS; trace_memory adds the Python heap peak from
+    tracemalloc, which slows every allocation, so latencies are then inflated.
+    '''
+    model = model or FakeChatModel()
+    graph = build_fake_graph(model, **(graph_options or {}))
+    instrumentation = Instrumentation(events_path=None)
+    brands = [f'Brand {index}' for index in range(runs)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {}
+
+    async def run_one(brand: str, url: str):
+        async with semaphore:
+            initial_data = {
+                'website_links': [url],
+                'requirements': f'{brand}, a fan apparel label. Goals: brand awareness, lead generation '
+                                'and customer retention. Budget Rs 5 lakh per month.',
+            }
+            started = time.perf_counter()
+            await graph.ainvoke(create_initial_state(initial_data), instrumentation.config(brand))
+            latencies[brand] = time.perf_counter() - started
+
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        async with FixtureSites(brands, latency=site_latency) as sites:
+            started = time.perf_counter()
+            await asyncio.gather(*(run_one(brand, sites.urls[brand]) for brand in brands))
+            wall_time = time.perf_counter() - started
+        traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        tracemalloc.stop()
+        await close_web_clients()
+
+    node_times: dict[str, list[float]] = {}
+    node_calls: dict[str, float] = {}
+    for brand in brands:
+        for node, stats in instrumentation.handler.summarize(brand).items():
+            if 'wall_time' in stats:
+                node_times.setdefault(node, []).append(stats['wall_time'])
+            node_calls[node] = node_calls.get(node, 0) + stats.get('llm_calls', 0)
+    values = list(latencies.values())
+    return {
+        'runs': runs,
+        'concurrency': concurrency,
+        'wall_time': wall_time,
+        'throughput_per_minute': 60 * runs / wall_time,
+        'latency': {
+            'mean': statistics.fmean(values),
+            'p50': percentile(values, 0.5),
+            'p95': percentile(values, 0.95),
+            'max': max(values),
+        },
+        'nodes': {
+            node: {
+                'p50': percentile(times, 0.5),
+                'p95': percentile(times, 0.95),
+                'llm_calls_per_run': node_calls.get(node, 0) / runs,
+            }
+            for node, times in sorted(node_times.items())
+        },
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'peak_traced_mb': traced_peak / 1024 / 1024 if traced_peak is not None else None,
+        'web_fetch': fetch_metrics.summary(),
+        'dedup': dedup_totals.summary(),
+        'speculation': speculation_totals.summary(),
+        'llm_cache': get_response_cache().stats(),
+        'rate_limit': get_rate_limiter().stats(),
+    }
+
+
+def print_report(report: dict):
+    latency = report['latency']
+    print(
+        f"\n{report['runs']} runs at concurrency {report['concurrency']}: "
+        f"{report['wall_time']:.2f}s wall, {report['throughput_per_minute']:.1f} runs/min, "
+        f"peak RSS {report['peak_rss_mb']:.1f} MB"
+        + (f", traced heap peak {report['peak_traced_mb']:.1f} MB" if report['peak_traced_mb'] is not None else '')
+    )
+    print(
+        f"end-to-end latency: mean {latency['mean']:.3f}s  p50 {latency['p50']:.3f}s  "
+        f"p95 {latency['p95']:.3f}s  max {latency['max']:.3f}s"
+    )
+    print(f"\n{'node':<28}{'p50 (s)':>10}{'p95 (s)':>10}{'llm calls/run':>16}")
+    for node, stats in report['nodes'].items():
+        print(f"{node:<28}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['llm_calls_per_run']:>16.1f}")
+    print(f"\nweb fetch: {json.dumps(report['web_fetch'])}")
+    print(f"dedup: {json.dumps(report['dedup'])}")
+    print(f"speculative format: {json.dumps(report['speculation'])}")
+    print(f"llm cache: {json.dumps(report['llm_cache'])}")
+    print(f"rate limit: {json.dumps(report['rate_limit'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the research graph offline.')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='Graph runs (one fixture brand each).')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Runs in flight at once.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Fake LLM seconds per call.')
+    parser.add_argument('--seconds-per-token', type=float, default=0.0, help='Fake LLM seconds per output token.')
+    parser.add_argument('--output-tokens', type=int, default=400, help='Fake LLM tokens per text answer.')
+    parser.add_argument('--rpm', type=float, help='Requests per minute budget of the fake model.')
+    parser.add_argument('--tpm', type=float, help='Tokens per minute budget of the fake model.')
+    parser.add_argument('--revisions', type=int, default=1, help='Quality-check rounds that ask for a revision.')
+    parser.add_argument('--site-latency', type=float, default=0.0, help='Fixture server seconds per request.')
+    parser.add_argument('--no-crawl', action='store_true', help='Fetch only the seed pages.')
+    parser.add_argument('--fan-out', action='store_true', help='Build the graph with per-goal fan-out.')
+    parser.add_argument('--speculative-format', action='store_true', help='Format the report during the quality check.')
+    parser.add_argument('--retrieval-budget', type=int, help='Override the brand tuner retrieval budget.')
+    parser.add_argument('--trace-memory', action='store_true', help='Report the tracemalloc heap peak (slows runs).')
+    parser.add_argument('--json', help='Also write the report to this file.')
+    args = parser.parse_args()
+
+    model = FakeChatModel(
+        latency=args.latency,
+        seconds_per_token=args.seconds_per_token,
+        output_tokens=args.output_tokens,
+        revision_rounds=args.revisions,
+        crawl=not args.no_crawl,
+    )
+    graph_options = {'fan_out': args.fan_out, 'speculative_format': args.speculative_format}
+    if args.retrieval_budget is not None:
+        graph_options['retrieval_budget'] = args.retrieval_budget
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    # caches and saved reports go to a scratch directory, so every benchmark starts cold
+    with tempfile.TemporaryDirectory(prefix='bench-') as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            set_page_cache(PageCache(os.path.join(workdir, 'pages.sqlite')))
+            set_response_cache(ResponseCache(MemoryTier()))
+            limits = dict(LIMITS)
+            if args.rpm or args.tpm:
+                limits[FAKE_ROUTE] = Budget(rpm=args.rpm, tpm=args.tpm)
+            set_rate_limiter(RateLimiter(limits))
+            report = asyncio.run(run_benchmark(
+                args.runs, args.concurrency, model, args.site_latency, graph_options, args.trace_memory
+            ))
+        finally:
+            os.chdir(cwd)
+
+    print_report(report)
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
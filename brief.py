@@ -0,0 +1,120 @@
+import re
+
+from pydantic import BaseModel, Field
+
+from goals import extract_goals
+
+# Structured brand brief: the details the requirements interview collects.
+# Briefs that already have every field skip the interview and summary LLM calls.
+REQUIRED_FIELDS = ('brand_name', 'budget', 'goals')
+FIELD_LABELS = {'brand_name': 'brand name', 'budget': 'budget', 'goals': 'marketing goals'}
+
+AMOUNT = r'\d[\d,]*(?:\.\d+)?'
+UNIT = r'(?:k|thousand|lakhs?|lacs?|crores?|cr|mn|million|m|bn|billion)\b'
+CURRENCY = r'(?:rs\.?|inr|₹|\$|usd|us\$|€|eur|£|gbp)'
+PERIOD = r'(?:\s*(?:per|a|/|every)\s*(?:month|year|quarter|week|campaign|annum)|\s*(?:monthly|yearly|annually))?'
+BUDGET = re.compile(
+    rf'(?:{CURRENCY}\s*{AMOUNT}(?:\s*{UNIT})?|{AMOUNT}\s*{UNIT}(?:\s*(?:rupees|inr|dollars|usd|euros|pounds))?'
+    rf'|{AMOUNT}\s*(?:rupees|inr|dollars|usd|euros|pounds)\b){PERIOD}',
+    re.IGNORECASE,
+)
+WORD = r"[A-Z0-9][\w&'’-]*"
+NAME = rf"[\"'“]?({WORD}(?:\s+(?:(?:of|and|&|the)\s+)?{WORD}){{0,4}})"
+# Only labelled names are extracted: "we are 3 friends" or "I run A small
+# bakery" look like names to a regex but are not.
+BRAND_NAME_PATTERNS = [
+    # "brand name is Acme", "Brand: Acme Co", "company called Acme"
+    re.compile(
+        r"(?i:\b(?:brand|company|business|store)(?:\s+name)?"
+        rf"(?:\s*(?:is|was|[:=-])\s*(?:(?:called|named)\s+)?|\s+(?:called|named)\s+)){NAME}"
+    ),
+]
+NOT_NAMES = {'a', 'an', 'the'}
+BUDGET_LABEL = re.compile(r'\bbudget\b', re.IGNORECASE)
+# how far an amount may sit from the word budget, within the same sentence
+BUDGET_LABEL_DISTANCE = 40
+SENTENCE_BREAK = re.compile(r'[.!?]\s+[A-Z]|\n')
+
+class Brief(BaseModel):
+    brand_name: str | None = Field(default=None, description='Name of the brand.')
+    budget: str | None = Field(default=None, description='Marketing budget, e.g. "Rs 5 lakh per month".')
+    goals: list[str] = Field(default_factory=list, description='Marketing goals, e.g. "Brand Awareness".')
+
+    @property
+    def missing(self) -> list[str]:
+        return [name for name in REQUIRED_FIELDS if not getattr(self, name)]
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing
+
+    def merged(self, other: 'Brief') -> 'Brief':
+        '''This brief with its empty fields filled from other; goals are combined.'''
+        goals = self.goals + [goal for goal in other.goals if goal not in self.goals]
+        return Brief(
+            brand_name=self.brand_name or other.brand_name,
+            budget=self.budget or other.budget,
+            goals=goals,
+        )
+
+
+def is_name(name: str) -> bool:
+    '''False for digits, articles and single letters caught by the name patterns.'''
+    words = name.lower().split()
+    return len(name) > 1 and not name.replace(',', '').isdigit() and not all(word in NOT_NAMES for word in words)
+
+
+def extract_brand_name(text: str) -> str | None:
+    for pattern in BRAND_NAME_PATTERNS:
+        for match in pattern.finditer(text):
+            name = match.group(1).strip(' .’\'"')
+            if is_name(name):
+                return name
+    return None
+
+
+def _labelled(text: str, match: re.Match) -> bool:
+    for label in BUDGET_LABEL.finditer(text):
+        if label.end() <= match.start():
+            gap = text[label.end():match.start()]
+        elif match.end() <= label.start():
+            gap = text[match.end():label.start()]
+        else:
+            continue
+        if len(gap) <= BUDGET_LABEL_DISTANCE and not SENTENCE_BREAK.search(gap):
+            return True
+    return False
+
+
+def extract_budget(text: str) -> str | None:
+    '''The first money amount next to the word budget ("budget $5k", "20k budget").'''
+    for match in BUDGET.finditer(text):
+        if _labelled(text, match):
+            return match.group(0).strip()
+    return None
+
+
+def extract_brief(text: str) -> Brief:
+    '''Fills what it can of a Brief from free text with regexes and keywords (no LLM).
+
+    Only labelled names and budgets are taken, so a complete result can stand
+    in for the interview and summary LLM calls.
+    '''
+    return Brief(brand_name=extract_brand_name(text), budget=extract_budget(text), goals=extract_goals(text))
+
+
+def render_brief(brief: Brief, details: str = '') -> str:
+    '''The requirements summary of a complete brief, in place of the summary LLM call.
+
+    Fields that are still empty are left out.
+    '''
+    lines = []
+    if brief.brand_name:
+        lines.append(f'Brand name: {brief.brand_name}')
+    if brief.budget:
+        lines.append(f'Budget: {brief.budget}')
+    if brief.goals:
+        lines.append(f"Marketing goals: {', '.join(brief.goals)}")
+    if details.strip():
+        lines += ['', 'Details from the user:', details.strip()]
+    return '\n'.join(lines)
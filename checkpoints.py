@@ -0,0 +1,24 @@
+import contextlib
+import os
+
+# Durable LangGraph checkpoints, keyed by run id (the graph's thread_id).
+CHECKPOINT_PATH = os.path.join('.cache', 'checkpoints.sqlite')
+
+
+@contextlib.asynccontextmanager
+async def open_checkpointer(path: str = CHECKPOINT_PATH):
+    '''Async SQLite checkpointer; every completed node of every run is persisted.'''
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    async with AsyncSqliteSaver.from_conn_string(path) as saver:
+        yield saver
+
+
+def run_config(run_id: str, config: dict | None = None) -> dict:
+    '''Adds the thread_id the checkpointer keys a run's checkpoints by.'''
+    config = dict(config or {})
+    config['configurable'] = {**(config.get('configurable') or {}), 'thread_id': run_id}
+    return config
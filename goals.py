@@ -0,0 +1,60 @@
+import re
+
+# Marketing goals the consultant prompt knows about, with the phrases that
+# identify them in a brief.
+MARKETING_GOALS = {
+    'Brand Awareness': ['brand awareness', 'visibility of the brand', 'brand visibility'],
+    'Lead Generation': ['lead generation', 'generate leads', 'more leads', 'sign ups'],
+    'Sales Growth': ['sales growth', 'more sales', 'increase sales', 'revenue growth'],
+    'Engagement': ['audience engagement', 'customer engagement', 'community building'],
+    'Customer Retention': ['customer retention', 'customer loyalty', 'repeat customers'],
+    'Market Expansion': ['market expansion', 'new markets'],
+    'Website Traffic': ['website traffic', 'web traffic', 'site traffic'],
+    'Search Engine Rankings': ['search engine rankings', 'search rankings'],
+    'Content Visibility': ['content visibility'],
+    'Conversion Rate': ['conversion rate', 'more conversions'],
+    'Brand Reputation': ['brand reputation', 'online reviews'],
+    'Product Launch Success': ['product launch', 'launch success'],
+}
+# Single words that are too generic on their own ("reach", "sales") and only
+# name a goal right after a label, as in "Goals: sales, reach".
+GOAL_WORDS = {
+    'Brand Awareness': ['awareness', 'reach', 'visibility'],
+    'Lead Generation': ['leads', 'signups'],
+    'Sales Growth': ['sales', 'revenue'],
+    'Engagement': ['engagement', 'community'],
+    'Customer Retention': ['retention', 'loyalty', 'churn'],
+    'Market Expansion': ['expansion'],
+    'Website Traffic': ['traffic'],
+    'Search Engine Rankings': ['seo', 'rankings'],
+    'Conversion Rate': ['conversions'],
+    'Brand Reputation': ['reputation', 'reviews'],
+    'Product Launch Success': ['launch'],
+}
+GOAL_LABEL = re.compile(r'\b(?:goals?|objectives?|aims?)\b[^.\n]*', re.IGNORECASE)
+
+# Each goal costs a consultant and a brand tuner call in the fan-out, so only
+# the first few are planned.
+MAX_GOALS = 4
+
+
+def _positions(phrases: list[str], text: str, offset: int = 0) -> list[int]:
+    return [
+        offset + match.start()
+        for phrase in phrases
+        for match in re.finditer(rf'\b{re.escape(phrase)}\b', text)
+    ]
+
+
+def extract_goals(text: str) -> list[str]:
+    '''Returns the marketing goals mentioned in text, in order of first mention.'''
+    text = text.lower()
+    labelled = [(match.start(), match.group(0)) for match in GOAL_LABEL.finditer(text)]
+    found = []
+    for goal, phrases in MARKETING_GOALS.items():
+        positions = _positions(phrases, text)
+        for start, clause in labelled:
+            positions += _positions(GOAL_WORDS.get(goal, []), clause, start)
+        if positions:
+            found.append((min(positions), goal))
+    return [goal for _, goal in sorted(found)]
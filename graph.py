@@ -1,35 +1,52 @@
+import argparse
 import asyncio
+import contextlib
 import functools
+import hashlib
 
 import os
+import time
 import uuid
 from langchain.output_parsers.openai_functions import JsonOutputFunctionsParser
 from langchain.agents import create_openai_tools_agent, AgentExecutor
-from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langgraph.constants import Send
 from langgraph.graph import END, StateGraph
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import ensure_config
+from langchain_core.runnables.config import var_child_runnable_config
 
 from colorama import Fore
+from prompt_agents.layout import cached_prompt
 from prompt_agents.prompt import Prompts
-from models import LLM
-from state import AgentState
-from tools.web import research
+from brief import Brief, extract_brief, render_brief
+from checkpoints import open_checkpointer, run_config
+from instrumentation import get_instrumentation, instrumented_config
+from goals import MAX_GOALS, extract_goals
+from models import shared_llm
+from rate_limit import INTERACTIVE, priority
+from retrieval import RETRIEVAL_TOKEN_BUDGET, format_passages, get_site_indexes
+from sections import select_sections, splice_sections, titles_match
+from speculation import Speculation
+from state import INPUT_NAME, AgentState
+from streaming import FileSink, Streamed, TokenStream, streaming_config
+from tools.web import close_web_clients, research
 from dotenv import load_dotenv
 
 load_dotenv()
 
 os.environ['LANGCHAIN_PROJECT'] = 'MARKETING_PROJECT'
 
-TAVILY_TOOL = TavilySearchResults(max_results=6)
-MODEL = LLM('groq', 'llama-3.1-70b-versatile').get_llm()
+API_SERVICE = 'groq'
+MODEL_NAME = 'llama-3.1-70b-versatile'
+# hedge and failover routes; ones without an installed SDK or API key are skipped
+FALLBACKS = (('groq', 'llama-3.1-8b-instant'), ('openai', 'gpt-4o-mini'))
 
 REQUIREMENTS_NAME = 'requirements'
 SUMMARY_NAME = 'summarizer'
-INPUT_NAME = 'inputer'
 ROUTE_OPTIONS = [INPUT_NAME, SUMMARY_NAME]
 
+WEBSITE_DATA_START = 'website_data_start'
 WEBSITE_DATA_AGENT = 'website_data_agent'
 CONSULTANT = 'consultant_agent'  # one with internet access
 BRAND_TUNER = 'brand_tuner_agent'
@@ -37,31 +54,104 @@ QUALITY_CHECKER = 'quality_checker_agent'
 FORMATTER = 'formater_node_agent'
 SAVE_FILE_NODE = 'save_file_agent'
 
+# per-goal fan-out mode
+GOAL_PLANNER = 'goal_planner'
+GOAL_WORKER = 'goal_strategy_agent'
+GOAL_MERGER = 'goal_merger'
+
 MEMBERS = [CONSULTANT, BRAND_TUNER]
 OPTIONS = MEMBERS + ['FINISH']
 
-def create_agent(llm, tools, system_prompt):
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ('system', system_prompt),
-            MessagesPlaceholder(variable_name='agent_scratchpad')
-        ]
-    )
+# quality-check rounds that may send work back before the report is finished anyway
+MAX_REVISIONS = 3
+
+OUTPUT_DIR = 'output'
+
+# seconds an uncollected background scrape (e.g. of an abandoned interview) is kept
+SCRAPE_TTL = 60 * 60
+
+
+@functools.lru_cache(maxsize=None)
+def get_tavily_tool():
+    '''Shared, rate-limited Tavily search tool, created on first use.'''
+    from tools.search import RateLimitedTavilySearch
+    return RateLimitedTavilySearch(max_results=6)
+
+
+def create_agent(llm, tools, instructions, inputs):
+    prompt = cached_prompt(instructions, inputs, agent=True)
     agent = create_openai_tools_agent(llm=llm, tools=tools, prompt=prompt)
     executor = AgentExecutor(agent=agent, tools=tools)
     return executor
 
+class BackgroundTasks:
+    '''Tasks started by one node and collected by a later one, by key.
+
+    Tasks nobody collects within ttl seconds are cancelled and dropped.
+    '''
+
+    def __init__(self, ttl: float = SCRAPE_TTL):
+        self.ttl = ttl
+        self._tasks: dict[str, tuple[float, asyncio.Task]] = {}
+
+    def start(self, coro) -> str:
+        self._prune()
+        key = uuid.uuid4().hex
+        task = asyncio.create_task(coro)
+        # failures surface when the task is collected; uncollected ones are not logged
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._tasks[key] = (time.monotonic(), task)
+        return key
+
+    def take(self, key: str | None) -> asyncio.Task | None:
+        '''The task started under key, or None if it is unknown here (e.g. a run resumed in a new process).'''
+        _, task = self._tasks.pop(key, (None, None)) if key else (None, None)
+        if task is not None and task.get_loop() is not asyncio.get_running_loop():
+            task.cancel()
+            return None
+        return task
+
+    def _prune(self):
+        now = time.monotonic()
+        for key, (started, task) in list(self._tasks.items()):
+            if now - started > self.ttl:
+                del self._tasks[key]
+                task.cancel()
+
+
+background_scrapes = BackgroundTasks()
+
+
+async def start_website_data(state: AgentState, agent):
+    '''Starts the website data agent as a background task, so the scrape runs
+    while the requirements interview waits on the user.'''
+    config = ensure_config()
+    # its calls are reported as the website data agent's
+    config = {**config, 'metadata': {**config.get('metadata', {}), 'langgraph_node': WEBSITE_DATA_AGENT}}
+
+    async def scrape():
+        # the agent executor takes part of its children's config from the context,
+        # which the task has its own copy of
+        var_child_runnable_config.set(config)
+        return await agent.ainvoke(state, config)
+
+    return {'scrape_id': background_scrapes.start(scrape())}
+
+
 async def async_agent_node(state: AgentState, agent, name):
-    result = await agent.ainvoke(state)
+    # the scrape started at the entry point, or a new one if it is not running in this process
+    task = background_scrapes.take(state.get('scrape_id'))
+    result = await task if task is not None else await agent.ainvoke(state)
     return {'website_data': [HumanMessage(content=result['output'], name=name)]}
 
 
 # input node 
-def input_node(state: AgentState):
+async def input_node(state: AgentState):
     # if state['next_requirements'] == '':
     #     details = input('Give some details about your brand:\n')
     # else:
-    details = input(f"{Fore.CYAN}{state['message_requirements'][-1].content}{Fore.RESET}:\n")
+    # input() blocks, so it runs in a thread to keep other runs on the loop moving
+    details = await asyncio.to_thread(input, f"{Fore.CYAN}{state['message_requirements'][-1].content}{Fore.RESET}:\n")
     return {'message_requirements': [HumanMessage(content=details, name = INPUT_NAME)]}
 
 # requirements node 
@@ -85,65 +175,162 @@ guided_json = {
     }
 }
 
-requirements_llm = LLM('groq', 'llama-3.1-70b-versatile').get_llm_binded_function([guided_json], {'name': 'router_fn'})
+def user_details(state: AgentState) -> str:
+    '''Everything the user has written during the interview.'''
+    return '\n'.join(str(m.content) for m in state['message_requirements'] if m.name == INPUT_NAME)
 
 
-prompt = ChatPromptTemplate.from_template(Prompts.get_requirement_prompt())
-requirements_chain = prompt | requirements_llm | JsonOutputFunctionsParser()
+def collect_brief(state: AgentState) -> Brief:
+    '''The typed brief, filled in from the user's labelled answers by the local extractor.'''
+    return Brief(**(state.get('brief') or {})).merged(extract_brief(user_details(state)))
 
 
-def requirements_node(state: AgentState):
-    result = requirements_chain.invoke(state)
+async def requirements_node(state: AgentState, chain):
+    if collect_brief(state).complete:
+        # every field is known, so there is nothing for the LLM to decide
+        return {
+            'message_requirements': [AIMessage(content='nothing more to ask', name=REQUIREMENTS_NAME)],
+            'next_requirements': 'SUMMARY',
+        }
+    # a user is waiting on this turn, so it goes ahead of queued batch calls
+    with priority(INTERACTIVE):
+        result = await chain.ainvoke(state)
     return {
         'message_requirements': [AIMessage(content=result['question'], name= REQUIREMENTS_NAME)],
-        'next_requirements' : result['next_requirements']
+        'next_requirements' : result['next_requirements'],
         }
 
-prompt_template = ChatPromptTemplate.from_template(Prompts.get_summarize_requirements())
-
-def summary(state: AgentState):
-    chain = prompt_template | MODEL | StrOutputParser()
-    result = chain.invoke(state)
+async def summary(state: AgentState, chain):
+    brief = collect_brief(state)
+    if brief.complete:
+        return {'input_data': render_brief(brief, user_details(state))}
+    result = await chain.ainvoke(state)
     return {'input_data': result}
 
 
-# creating agents
-website_data_agent = create_agent(MODEL, [research], Prompts.get_website_data())
-website_data_node = functools.partial(
-    async_agent_node, agent=website_data_agent, name=WEBSITE_DATA_AGENT
-)
-
-consultant_agent = create_agent(MODEL, [TAVILY_TOOL], Prompts.get_consultant_prompt())
-
-def consultant_agent_node(state, agent, name):
-    result = agent.invoke(state)
+async def revise_sections(state, revision_agent, previous, **inputs):
+    '''Regenerates only the sections the quality checker rejected.
+
+    Returns previous with those sections replaced, or None when a full
+    regeneration is needed (first pass, no failed sections, or none of them
+    can be found in previous).
+    '''
+    failed_sections = state.get('failed_sections') or []
+    if revision_agent is None or not failed_sections or not previous:
+        return None
+    previous_sections = select_sections(previous, failed_sections)
+    if not previous_sections:
+        return None
+    result = await revision_agent.ainvoke({
+        **state,
+        **inputs,
+        'failed_sections': ', '.join(failed_sections),
+        'previous_sections': previous_sections,
+    })
+    return splice_sections(previous, result['output'], failed_sections)
+
+
+async def consultant_agent_node(state, agent, name, revision_agent=None):
+    output = await revise_sections(state, revision_agent, state['last_consultant'])
+    if output is None:
+        result = await agent.ainvoke(state)
+        output = result['output']
     # print('\n\nlast_consutant: ', state['last_consultant'])
     # state['last_consultant'] = result['output']
     # print('\n\nafter updatelast_consutant: ', state['last_consultant'])
     return {
-        'consultant': [HumanMessage(content=result['output'], name=name)],
-        'last_consultant': result['output']    
+        'consultant': [HumanMessage(content=output, name=name)],
+        'last_consultant': output
+        }
+
+def with_retrieved_website_data(state, token_budget, *focus):
+    '''Swaps website_data for the indexed passages most relevant to this call.
+
+    Falls back to the full website_data when retrieval is off or nothing has
+    been indexed for the brand's sites (e.g. a run resumed in a new process).
+    '''
+    if not token_budget:
+        return state
+    query = ' '.join([state['input_data'], state.get('feedback') or '', *focus])
+    passages = get_site_indexes().retrieve(state.get('website_links') or [], query, token_budget)
+    if not passages:
+        return state
+    return {**state, 'website_data': format_passages(passages)}
+
+
+async def brand_tuner_agent_node(state, agent, name, revision_agent=None, retrieval_budget=RETRIEVAL_TOKEN_BUDGET):
+    state = with_retrieved_website_data(state, retrieval_budget, *(state.get('failed_sections') or []))
+    consultant_sections = select_sections(state['last_consultant'], state.get('failed_sections') or [])
+    output = await revise_sections(
+        state, revision_agent, state['last_brand_tuner'],
+        consultant_sections=consultant_sections or state['last_consultant'],
+    )
+    if output is None:
+        result = await agent.ainvoke(state)
+        output = result['output']
+    # state['last_brand_tuner'] = result['output']
+    return {
+        'brand_tuner': [HumanMessage(content=output, name=name)],
+        'last_brand_tuner': output
         }
 
-consultant_node = functools.partial(
-    consultant_agent_node, agent=consultant_agent, name=CONSULTANT
-)
+# PER-GOAL FAN-OUT
+async def goal_planner_node(state: AgentState):
+    # goals are fixed after the first pass so revisions address the same set;
+    # they come from the user's own words, which the LLM summary pads with generic ones
+    goals = state.get('goals') or (state.get('brief') or {}).get('goals') or extract_goals(user_details(state))
+    return {'goals': goals[:MAX_GOALS] or ['']}
+
+
+def dispatch_goals(state: AgentState):
+    '''One worker per goal; on a revision only the goals the quality checker
+    rejected are redone, starting from the consultant or the brand tuner.'''
+    goals = state['goals']
+    stage = BRAND_TUNER if state['next'] == BRAND_TUNER else CONSULTANT
+    failed_sections = state.get('failed_sections') or []
+    if state['next'] in MEMBERS and failed_sections:
+        goals = [
+            goal for goal in goals
+            if any(titles_match(goal, failed) for failed in failed_sections)
+        ] or goals
+    return [Send(GOAL_WORKER, {**state, 'goal': goal, 'stage': stage}) for goal in goals]
+
+
+async def goal_worker_node(task, consultant_agent, brand_tuner_agent, retrieval_budget=RETRIEVAL_TOKEN_BUDGET):
+    goal = task['goal']
+    previous = task['goal_outputs'].get(goal, {})
+    goal_state = {
+        **task,
+        'input_data': f"{task['input_data']}\n\nFocus only on this marketing goal: {goal}" if goal else task['input_data'],
+        'last_consultant': previous.get('consultant', ''),
+        'last_brand_tuner': previous.get('brand_tuner', ''),
+    }
+    consultant_output = goal_state['last_consultant']
+    if task['stage'] == CONSULTANT or not consultant_output:
+        consultant_output = (await consultant_agent.ainvoke(goal_state))['output']
+    brand_tuner_state = with_retrieved_website_data(
+        {**goal_state, 'last_consultant': consultant_output}, retrieval_budget, goal
+    )
+    brand_tuner_output = (await brand_tuner_agent.ainvoke(brand_tuner_state))['output']
+    return {'goal_outputs': {goal: {'consultant': consultant_output, 'brand_tuner': brand_tuner_output}}}
 
-brand_tuner_agent = create_agent(MODEL, [TAVILY_TOOL], Prompts.get_brand_tuner_prompt())
 
+async def goal_merge_node(state: AgentState):
+    outputs = state['goal_outputs']
 
+    def merge(key):
+        return '\n\n'.join(
+            f"## {goal}\n\n{outputs[goal][key]}" if goal else outputs[goal][key]
+            for goal in state['goals'] if goal in outputs
+        )
 
-def brand_tuner_agent_node(state, agent, name):
-    result = agent.invoke(state)
-    # state['last_brand_tuner'] = result['output']
+    last_consultant, last_brand_tuner = merge('consultant'), merge('brand_tuner')
     return {
-        'brand_tuner': [HumanMessage(content=result['output'], name=name)],
-        'last_brand_tuner': result['output']
-        }
-
-brand_tuner_node = functools.partial(
-    brand_tuner_agent_node, agent = brand_tuner_agent, name=BRAND_TUNER
-)
+        'consultant': [HumanMessage(content=last_consultant, name=CONSULTANT)],
+        'last_consultant': last_consultant,
+        'brand_tuner': [HumanMessage(content=last_brand_tuner, name=BRAND_TUNER)],
+        'last_brand_tuner': last_brand_tuner,
+    }
 
 # QUALITY CHECK NODE
 
@@ -161,33 +348,46 @@ router_function_def = {
             "feedback": {
                 "type": "string",
                 "description": "Feedback on the current state or reason for the selection."
+            },
+            "failed_sections": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Headings or goal names of the sections that need rework; empty to redo everything."
             }
         },
         "required": ["next", "feedback"]
     }
 }
 
-quality_check_template = ChatPromptTemplate.from_messages([
-    ('system', Prompts.get_quality_check_prompt()),
-    (
-        'system',
-        'Given the conversation above, who should act next?'
-        ' Or should we FINISH? Select one of: {options}',
-    )]
-).partial(options=', '.join(OPTIONS), members=', '.join(MEMBERS))
+def review_digest(state: AgentState) -> str:
+    content = f"{state['last_consultant']}\x00{state['last_brand_tuner']}"
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
 
-QUALITY_CHECKER_MODEL = LLM('groq', 'llama-3.1-70b-versatile').get_llm_binded_function([router_function_def], {'name': 'route'})
 
-quality_check_chain = (
-    quality_check_template
-    | QUALITY_CHECKER_MODEL
-    | JsonOutputFunctionsParser()
-)
-
-def quality_check_node_func(state: AgentState, agent, name):
+async def quality_check_node_func(state: AgentState, agent, name, max_revisions=MAX_REVISIONS, speculative_formatter=None):
     # for k, v in state.items():
     #     print(k, ':', v, '\n****************\n')
-    result = agent.invoke(state)
+    digest = review_digest(state)
+    revision = state.get('revision', 0)
+    speculation = None
+    if digest == state.get('reviewed_digest'):
+        # the last revision changed nothing, another review would not either
+        result = {'next': 'FINISH', 'feedback': 'No changes since the previous review.'}
+    else:
+        if speculative_formatter is not None:
+            # most reviews pass, so the report is formatted while this one runs
+            speculation = Speculation(speculative_formatter(state))
+        try:
+            result = await agent.ainvoke(state)
+        except BaseException:
+            if speculation is not None:
+                await speculation.discard()
+            raise
+        if result['next'] != 'FINISH' and revision >= max_revisions:
+            result = {**result, 'next': 'FINISH'}
+    failed_sections = result.get('failed_sections') or []
+    if isinstance(failed_sections, str):
+        failed_sections = [failed_sections]
 
     # print('RESULT\n\n\n****************************')
     # print(result)
@@ -198,30 +398,73 @@ def quality_check_node_func(state: AgentState, agent, name):
     # print('*********************************')
     # state['feedback'] = result['output'].get('feedback', '')
     # state['next'] = result['output'].get('next', 'FINISH')
-    return {
+    update = {
         'quality_checker': [HumanMessage(content=str(result), name=name)],
         'last_quality_checker': result,
         'feedback': result['feedback'],
-        'next': result['next']
+        'next': result['next'],
+        'failed_sections': failed_sections if result['next'] != 'FINISH' else [],
+        'revision': revision + (result['next'] != 'FINISH'),
+        'reviewed_digest': digest
         }
-
-quality_check_node = functools.partial(
-    quality_check_node_func, agent=quality_check_chain, name=QUALITY_CHECKER
-)
-
-formatter_template = ChatPromptTemplate.from_messages(
-    [
-        ('system', Prompts.get_formater_prompt())
-    ]
-)
-
-formatter_chain = formatter_template | MODEL | StrOutputParser()
-def formatter_node(state):
-    result = formatter_chain.invoke(state)
+    if speculation is not None:
+        if result['next'] == 'FINISH':
+            try:
+                # final_output and output_file of the speculative formatter
+                update.update(await speculation.commit())
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                print('The speculative formatter was cancelled; formatting the report again.')
+            except Exception as e:
+                # without output_file, after_review sends the report to the formatter
+                print(f'The speculative formatter failed ({e!r}); formatting the report again.')
+        else:
+            await speculation.discard()
+            print(f"Discarded the speculative report: the quality check sent it to {result['next']}.")
+    return update
+
+
+def after_review(state: AgentState) -> str:
+    '''The quality check's verdict; FORMATTED when it finished and the report is already formatted.'''
+    if state['next'] == 'FINISH' and state.get('output_file'):
+        return 'FORMATTED'
+    return state['next']
+
+
+def new_output_file() -> str:
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    return os.path.join(OUTPUT_DIR, f"{uuid.uuid1()}.md")
+
+
+async def formatter_node(state, chain, config=None):
+    # the report is written to its file token by token, so it can be read while it is generated
+    filename = await asyncio.to_thread(new_output_file)
+    file = await asyncio.to_thread(open, filename, 'w', encoding='utf-8')
+    sink = FileSink(file)
+    try:
+        result = await chain.ainvoke(state, streaming_config(config, sink=sink.write))
+        await sink.close()
+        if ''.join(sink.tokens) != result:
+            # cached answers are not streamed
+            await asyncio.to_thread(rewrite_file, file, result)
+    except BaseException:
+        sink.cancel()
+        await asyncio.to_thread(file.close)
+        await asyncio.to_thread(os.remove, filename)
+        raise
+    await asyncio.to_thread(file.close)
     return {
-        'final_output': result
+        'final_output': result,
+        'output_file': filename
     }
 
+
+def rewrite_file(file, content: str):
+    file.seek(0)
+    file.truncate()
+    file.write(content)
+
 # def save_file_node(state: AgentState):
 #     markdown_content = str(state["final_output"])
 #     name = state['website_links'][0]
@@ -232,70 +475,214 @@ def formatter_node(state):
 #         'final_output': f'Saved final output to {filename}'
 #     }
 
-def save_file_node(state: AgentState):
-    output_dir = "output"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    markdown_content = str(state["final_output"])
-    name = state['website_links'][0]
-    filename = os.path.join(output_dir, f"{uuid.uuid1()}.md")
-    
+async def speculative_formatter_node(state, chain):
+    '''formatter_node started from inside the quality check, attributed to the formatter.'''
+    config = ensure_config()
+    metadata = {**config.get('metadata', {}), 'langgraph_node': FORMATTER, 'speculative': True}
+    return await formatter_node(state, chain, {**config, 'metadata': metadata})
+
+
+def write_file(filename: str, content: str):
     with open(filename, "w", encoding="utf-8") as file:
-        file.write(markdown_content)
-    
+        file.write(content)
+
+
+async def save_file_node(state: AgentState):
+    filename = state.get('output_file')
+    if not filename or not await asyncio.to_thread(os.path.exists, filename):
+        # the formatter normally streams the report to its file already
+        filename = await asyncio.to_thread(new_output_file)
+        await asyncio.to_thread(write_file, filename, str(state["final_output"]))
+
     return {
         'final_output': f'Saved final output to {filename}'
     }
 
-workflow = StateGraph(AgentState)
-workflow.add_node(INPUT_NAME, input_node)
-workflow.add_node(REQUIREMENTS_NAME, requirements_node)
-workflow.add_node(SUMMARY_NAME, summary)
-workflow.add_node(WEBSITE_DATA_AGENT, website_data_node)
-workflow.add_node(CONSULTANT, consultant_node)
-workflow.add_node(BRAND_TUNER, brand_tuner_node)
-workflow.add_node(QUALITY_CHECKER, quality_check_node)
-workflow.add_node(FORMATTER, formatter_node)
-workflow.add_node(SAVE_FILE_NODE, save_file_node)
-
-workflow.set_entry_point(REQUIREMENTS_NAME)
-workflow.add_edge(INPUT_NAME, REQUIREMENTS_NAME)
-
-workflow.add_conditional_edges(
-    REQUIREMENTS_NAME, 
-    lambda x: x['next_requirements'],
-    {
-        'SUMMARY': SUMMARY_NAME,
-        'MORE_INPUT': INPUT_NAME
-    }
-)
 
-workflow.add_edge(SUMMARY_NAME, WEBSITE_DATA_AGENT)
-workflow.add_edge(WEBSITE_DATA_AGENT, CONSULTANT)
-workflow.add_edge(CONSULTANT, BRAND_TUNER)
-workflow.add_edge(BRAND_TUNER, QUALITY_CHECKER)
+def build_graph(model=None, requirements_model=None, quality_checker_model=None, search_tool=None, checkpointer=None,
+                max_revisions=MAX_REVISIONS, targeted_revisions=True, fan_out=False,
+                retrieval_budget=RETRIEVAL_TOKEN_BUDGET, interrupt_before_input=False, stream_agents=False,
+                speculative_format=False):
+    '''Builds and compiles the research graph.
+
+    Nothing is created at import time; models default to the shared
+    API_SERVICE/MODEL_NAME clients and search_tool to the shared Tavily tool.
+    With a checkpointer, runs are persisted per thread_id and can be resumed
+    (see stream_run). With targeted_revisions, quality-check loops regenerate
+    only the failed sections; max_revisions caps the number of loops.
+    With fan_out, the consultant and brand tuner run once per marketing goal
+    in parallel and are merged before the quality check. The brand tuner gets
+    the retrieved website passages within retrieval_budget tokens (0 sends all
+    of website_data). With interrupt_before_input (requires a checkpointer),
+    runs pause before the console input node so answers can be supplied
+    through answer_requirements instead of input(). The formatter always
+    streams its tokens (see stream_run); stream_agents makes the consultant
+    and brand tuner stream theirs too. With speculative_format, the formatter
+    starts alongside every quality check; its report is kept when the check
+    finishes the run and cancelled otherwise (see speculation.py).
+    '''
+    if model is None:
+        model = shared_llm(API_SERVICE, MODEL_NAME, FALLBACKS).get_llm()
+    if requirements_model is None:
+        requirements_model = shared_llm(API_SERVICE, MODEL_NAME, FALLBACKS).get_llm_binded_function([guided_json], {'name': 'router_fn'})
+    if quality_checker_model is None:
+        quality_checker_model = shared_llm(API_SERVICE, MODEL_NAME, FALLBACKS).get_llm_binded_function([router_function_def], {'name': 'route'})
+    if search_tool is None:
+        search_tool = get_tavily_tool()
+
+    # every prompt is built once here: static instructions first, inputs after
+    requirements_prompt = cached_prompt(Prompts.get_requirement_prompt(), Prompts.get_inputs('requirement'))
+    requirements_chain = requirements_prompt | requirements_model | JsonOutputFunctionsParser()
+    summary_prompt = cached_prompt(Prompts.get_summarize_requirements(), Prompts.get_inputs('summarize_requirements'))
+    summary_chain = summary_prompt | model | StrOutputParser()
+
+    # creating agents
+    website_data_agent = create_agent(model, [research], Prompts.get_website_data(), Prompts.get_inputs('website_data'))
+    consultant_agent = create_agent(model, [search_tool], Prompts.get_consultant_prompt(), Prompts.get_inputs('consultant'))
+    brand_tuner_agent = create_agent(model, [search_tool], Prompts.get_brand_tuner_prompt(), Prompts.get_inputs('brand_tuner'))
+    consultant_revision_agent = brand_tuner_revision_agent = None
+    if targeted_revisions:
+        consultant_revision_agent = create_agent(
+            model, [search_tool], Prompts.get_consultant_revision_prompt(), Prompts.get_inputs('consultant_revision')
+        )
+        brand_tuner_revision_agent = create_agent(
+            model, [search_tool], Prompts.get_brand_tuner_revision_prompt(), Prompts.get_inputs('brand_tuner_revision')
+        )
+    if stream_agents:
+        consultant_agent, brand_tuner_agent = Streamed(consultant_agent), Streamed(brand_tuner_agent)
+        if targeted_revisions:
+            consultant_revision_agent = Streamed(consultant_revision_agent)
+            brand_tuner_revision_agent = Streamed(brand_tuner_revision_agent)
+
+    quality_check_template = cached_prompt(
+        f"{Prompts.get_quality_check_prompt().strip()}\n"
+        f"Given the inputs, who should act next? Or should we FINISH? Select one of: {', '.join(OPTIONS)}",
+        Prompts.get_inputs('quality_check'),
+    )
+    quality_check_chain = (
+        quality_check_template
+        | quality_checker_model
+        | JsonOutputFunctionsParser()
+    )
+
+    formatter_template = cached_prompt(Prompts.get_formater_prompt(), Prompts.get_inputs('formater'))
+    formatter_chain = formatter_template | model | StrOutputParser()
+
+    website_data_node = functools.partial(
+        async_agent_node, agent=website_data_agent, name=WEBSITE_DATA_AGENT
+    )
+    consultant_node = functools.partial(
+        consultant_agent_node, agent=consultant_agent, name=CONSULTANT,
+        revision_agent=consultant_revision_agent
+    )
+    brand_tuner_node = functools.partial(
+        brand_tuner_agent_node, agent=brand_tuner_agent, name=BRAND_TUNER,
+        revision_agent=brand_tuner_revision_agent, retrieval_budget=retrieval_budget
+    )
+    quality_check_node = functools.partial(
+        quality_check_node_func, agent=quality_check_chain, name=QUALITY_CHECKER,
+        max_revisions=max_revisions,
+        speculative_formatter=functools.partial(speculative_formatter_node, chain=formatter_chain) if speculative_format else None
+    )
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node(INPUT_NAME, input_node)
+    workflow.add_node(REQUIREMENTS_NAME, functools.partial(requirements_node, chain=requirements_chain))
+    workflow.add_node(SUMMARY_NAME, functools.partial(summary, chain=summary_chain))
+    workflow.add_node(WEBSITE_DATA_START, functools.partial(start_website_data, agent=website_data_agent))
+    workflow.add_node(WEBSITE_DATA_AGENT, website_data_node)
+    if fan_out:
+        workflow.add_node(GOAL_PLANNER, goal_planner_node)
+        workflow.add_node(GOAL_WORKER, functools.partial(
+            goal_worker_node, consultant_agent=consultant_agent, brand_tuner_agent=brand_tuner_agent,
+            retrieval_budget=retrieval_budget
+        ))
+        workflow.add_node(GOAL_MERGER, goal_merge_node)
+    else:
+        workflow.add_node(CONSULTANT, consultant_node)
+        workflow.add_node(BRAND_TUNER, brand_tuner_node)
+    workflow.add_node(QUALITY_CHECKER, quality_check_node)
+    workflow.add_node(FORMATTER, functools.partial(formatter_node, chain=formatter_chain))
+    workflow.add_node(SAVE_FILE_NODE, save_file_node)
+
+    # Scraping only needs website_links, so it starts at the entry point as a
+    # background task: nodes of one superstep run in lock-step, and the
+    # interview must not wait for the scrape before asking its first question.
+    # WEBSITE_DATA_AGENT collects the scrape once the requirements are summarized.
+    workflow.set_conditional_entry_point(
+        lambda x: [
+            SUMMARY_NAME if x['requirements_completed'] else REQUIREMENTS_NAME,
+            WEBSITE_DATA_START
+        ],
+        [REQUIREMENTS_NAME, SUMMARY_NAME, WEBSITE_DATA_START]
+    )
+    workflow.add_edge(WEBSITE_DATA_START, END)
+    workflow.add_edge(SUMMARY_NAME, WEBSITE_DATA_AGENT)
+    workflow.add_edge(INPUT_NAME, REQUIREMENTS_NAME)
+
+    workflow.add_conditional_edges(
+        REQUIREMENTS_NAME, 
+        lambda x: x['next_requirements'],
+        {
+            'SUMMARY': SUMMARY_NAME,
+            'MORE_INPUT': INPUT_NAME
+        }
+    )
+
+    if fan_out:
+        # the goal planner waits for the website data, then fans out per goal
+        workflow.add_edge(WEBSITE_DATA_AGENT, GOAL_PLANNER)
+        workflow.add_conditional_edges(GOAL_PLANNER, dispatch_goals, [GOAL_WORKER])
+        workflow.add_edge(GOAL_WORKER, GOAL_MERGER)
+        workflow.add_edge(GOAL_MERGER, QUALITY_CHECKER)
+        conditional_map = {name: GOAL_PLANNER for name in MEMBERS}
+    else:
+        workflow.add_edge(WEBSITE_DATA_AGENT, CONSULTANT)
+        workflow.add_edge(CONSULTANT, BRAND_TUNER)
+        workflow.add_edge(BRAND_TUNER, QUALITY_CHECKER)
+        conditional_map = {name: name for name in MEMBERS}
+    conditional_map['FINISH'] = FORMATTER
+    conditional_map['FORMATTED'] = SAVE_FILE_NODE
+
+    workflow.add_conditional_edges(
+        QUALITY_CHECKER,
+        after_review,
+        conditional_map
+    )
+
+    workflow.add_edge(FORMATTER, SAVE_FILE_NODE)
+    workflow.add_edge(SAVE_FILE_NODE, END)
 
-conditional_map = {name: name for name in MEMBERS}
-conditional_map['FINISH'] = FORMATTER
+    return workflow.compile(
+        checkpointer=checkpointer,
+        interrupt_before=[INPUT_NAME] if interrupt_before_input else None,
+    )
 
-workflow.add_conditional_edges(
-    QUALITY_CHECKER,
-    lambda x: x['next'],
-    conditional_map
-)
 
-workflow.add_edge(FORMATTER, SAVE_FILE_NODE)
-workflow.add_edge(SAVE_FILE_NODE, END)
+@functools.lru_cache(maxsize=None)
+def get_graph():
+    '''Shared compiled graph, built on first use.'''
+    return build_graph()
 
-# workflow.set_config(recursion_limit = 50)
-graph = workflow.compile()
 
+def create_initial_state(initial_data) -> AgentState:
+    '''Initial graph state from {'website_links': [...], 'requirements': optional str}
+    plus any typed brief fields (brand_name, budget, goals).
 
-async def run_research_graph(initial_data):
-    initial_state = AgentState(
+    When requirements are supplied, or the typed fields make a complete
+    brief, the interview is skipped and the graph starts by summarizing them;
+    a complete brief is rendered from a template without an LLM call.
+    '''
+    requirements = initial_data.get('requirements')
+    brief = Brief.model_validate({name: value for name, value in initial_data.items() if value is not None})
+    requirements_completed = bool(requirements) or brief.complete
+    if not requirements_completed and brief != Brief():
+        # the interview LLM only reads messages, so partial typed fields are passed on as one
+        requirements = render_brief(brief)
+    return AgentState(
         website_links=initial_data["website_links"],
-        requirements_completed=False,
+        requirements_completed=requirements_completed,
+        brief=brief.model_dump(),
         website_data=[],
         brand_tuner=[],
         consultant=[],
@@ -308,17 +695,121 @@ async def run_research_graph(initial_data):
         OPTIONS= ['consultant_agent', 'brand_tuner_agent', 'FINISH'],
         MEMBERS= ['consultant_agent', 'brand_tuner_agent'],
         final_output="",
-        message_requirements=[],
+        output_file="",
+        message_requirements=[HumanMessage(content=requirements, name=INPUT_NAME)] if requirements else [],
         next_requirements='',
-        input_data=''
+        input_data='',
+        scrape_id='',
+        failed_sections=[],
+        revision=0,
+        reviewed_digest='',
+        goals=[],
+        goal_outputs={}
+    )
+
+
+async def stream_run(graph, initial_data, config, stream_mode='updates'):
+    '''Streams node updates for a run, resuming it from its last checkpoint.
+
+    If the graph has a checkpointer and config's thread already has
+    checkpoints, only the nodes that did not complete are run; a run that
+    already finished yields nothing. With stream_mode ['updates', 'messages']
+    it yields (mode, payload) pairs instead, where messages payloads are
+    (token chunk, metadata) from the nodes that stream (see streaming.py).
+    '''
+    graph_input = create_initial_state(initial_data)
+    if graph.checkpointer is not None:
+        snapshot = await graph.aget_state(config)
+        if snapshot.values:
+            if not snapshot.next:
+                return
+            print(f"Resuming run {config['configurable']['thread_id']} at {', '.join(snapshot.next)}")
+            graph_input = None
+
+    if stream_mode == 'updates':
+        async for output in graph.astream(graph_input, config=config):
+            yield output
+        return
+
+    queue = asyncio.Queue()
+    config = {**config, 'callbacks': [*(config.get('callbacks') or []), TokenStream(queue)]}
+
+    async def run():
+        try:
+            async for output in graph.astream(graph_input, config=config):
+                queue.put_nowait(('updates', output))
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(run())
+    try:
+        while (item := await queue.get()) is not None:
+            yield item
+        await task
+    finally:
+        task.cancel()
+
+
+async def pending_question(graph, config) -> str | None:
+    '''The requirements question a run paused before INPUT_NAME is waiting on, else None.'''
+    snapshot = await graph.aget_state(config)
+    if INPUT_NAME not in snapshot.next:
+        return None
+    messages = snapshot.values.get('message_requirements') or []
+    return messages[-1].content if messages else ''
+
+
+async def answer_requirements(graph, config, answer: str):
+    '''Records the user's answer as if input_node had run, so the run can continue.'''
+    await graph.aupdate_state(
+        config, {'message_requirements': [HumanMessage(content=answer, name=INPUT_NAME)]}, as_node=INPUT_NAME
     )
-        
-    async for output in graph.astream(initial_state):
-        for node_name, output_value in output.items():
-            print("---")
-            print(f"Output from node '{node_name}':")
-            print(output_value)
-        print("\n---\n")
+
+
+async def run_research_graph(initial_data, graph=None, run_id=None, graph_options=None):
+    run_id = run_id or str(uuid.uuid4())
+    print(f"Run id: {run_id} (pass it again to resume this run)")
+    config = run_config(run_id, instrumented_config(run_id))
+
+    async with contextlib.AsyncExitStack() as stack:
+        stack.push_async_callback(close_web_clients)
+        if graph is None:
+            graph = build_graph(
+                checkpointer=await stack.enter_async_context(open_checkpointer()), **(graph_options or {})
+            )
+
+        streaming_node = None
+        async for mode, payload in stream_run(graph, initial_data, config, ['updates', 'messages']):
+            if mode == 'messages':
+                chunk, metadata = payload
+                if metadata.get('langgraph_node') != streaming_node:
+                    streaming_node = metadata.get('langgraph_node')
+                    speculative = ' (speculative)' if metadata.get('speculative') else ''
+                    print(f"\n--- Streaming from node '{streaming_node}'{speculative}:")
+                print(chunk.content, end='', flush=True)
+                continue
+            streaming_node = None
+            for node_name, output_value in payload.items():
+                print("---")
+                print(f"Output from node '{node_name}':")
+                if node_name != SAVE_FILE_NODE and 'final_output' in output_value:
+                    # streamed reports were printed as they were generated
+                    output_value = {**output_value, 'final_output': '(streamed above)'}
+                print(output_value)
+            print("\n---\n")
+
+        if graph.checkpointer is not None:
+            final_state = await graph.aget_state(config)
+            print(final_state.values.get('final_output', ''))
+
+    report = get_instrumentation().handler.summarize(run_id)
+    for node_name, values in report.items():
+        print(
+            f"{node_name}: wall {values.get('wall_time', 0):.2f}s, "
+            f"llm {values.get('llm_time', 0):.2f}s, tool {values.get('tool_time', 0):.2f}s, "
+            f"tokens {int(values.get('prompt_tokens', 0))}/{int(values.get('completion_tokens', 0))}, "
+            f"cache hits {int(values.get('cache_hits', 0))}, cost ${values.get('cost', 0):.4f}"
+        )
 
 
 # data_input = '''Brand Name: The Souled Store
@@ -334,8 +825,18 @@ async def run_research_graph(initial_data):
 # Footwear
 # Merchandise related to movies, TV shows, and sports teams'''
 
-website_links = ['https://www.thesouledstore.com']
-initial_data = {
-    "website_links": website_links
-}
-asyncio.run(run_research_graph(initial_data))
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a marketing report for one brand.')
+    parser.add_argument('--run-id', help='Resume (or start) the run with this id.')
+    parser.add_argument('--fan-out', action='store_true', help='Generate strategies per marketing goal in parallel.')
+    parser.add_argument('--stream-agents', action='store_true', help='Also stream consultant and brand tuner tokens.')
+    parser.add_argument('--speculative-format', action='store_true', help='Format the report while it is quality checked.')
+    args = parser.parse_args()
+
+    website_links = ['https://www.thesouledstore.com']
+    initial_data = {
+        "website_links": website_links
+    }
+    asyncio.run(run_research_graph(initial_data, run_id=args.run_id, graph_options={
+        'fan_out': args.fan_out, 'stream_agents': args.stream_agents, 'speculative_format': args.speculative_format,
+    }))
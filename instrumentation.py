@@ -0,0 +1,350 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from llm_cache import get_response_cache
+from rate_limit import get_rate_limiter
+from speculation import speculation_totals
+from tools.dedup import dedup_totals
+from tools.metrics import fetch_metrics
+
+# Per-node latency, token and cost accounting for graph runs, exported to
+# a local JSONL file and a Prometheus text endpoint.
+EVENTS_PATH = os.path.join('output', 'metrics.jsonl')
+METRICS_PORT = 9464
+# runs whose per-node totals are kept until they are summarized; the oldest are dropped beyond this
+MAX_RUNS = 1000
+
+# USD per 1M tokens: (prompt, completion)
+PRICES = {
+    'llama-3.1-70b-versatile': (0.59, 0.79),
+    'llama-3.1-8b-instant': (0.05, 0.08),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+    'claude-3-5-sonnet-20240620': (3.00, 15.00),
+    'claude-3-haiku-20240307': (0.25, 1.25),
+    'gemini-1.5-flash': (0.075, 0.30),
+    'mistral-large-latest': (2.00, 6.00),
+}
+
+
+def estimate_cost(model: str | None, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = PRICES.get(model or '', (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def _token_usage(response) -> tuple[int, int]:
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+    usage = (response.llm_output or {}).get('token_usage') or {}
+    return usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+
+
+def _is_cache_hit(response) -> bool:
+    return any(
+        (generation.generation_info or {}).get('cache_hit')
+        for generations in response.generations
+        for generation in generations
+    )
+
+
+class JsonlExporter:
+    '''Appends every event as one JSON line, from a background writer thread.
+
+    The handler runs inline on the event loop, so export() only queues the
+    event; the writer appends whatever has queued up in one write.
+    '''
+
+    def __init__(self, path: str = EVENTS_PATH):
+        self.path = path
+        self._queue: queue.Queue[dict] = queue.Queue()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        threading.Thread(target=self._write_events, name='jsonl-exporter', daemon=True).start()
+        # events still queued when the process exits are written first
+        atexit.register(self.flush)
+
+    def export(self, event: dict):
+        self._queue.put(event)
+
+    def _write_events(self):
+        while True:
+            events = [self._queue.get()]
+            while True:
+                try:
+                    events.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.writelines(json.dumps(event, default=str) + '\n' for event in events)
+            except OSError as error:
+                print(f'Could not write {len(events)} metrics events to {self.path}: {error!r}')
+            finally:
+                for _ in events:
+                    self._queue.task_done()
+
+    def flush(self):
+        '''Waits until every exported event has been written.'''
+        self._queue.join()
+
+
+class PrometheusExporter:
+    '''Aggregates events into counters rendered in the Prometheus text format.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[tuple[str, tuple], float] = defaultdict(float)
+
+    def _inc(self, metric: str, value: float, **labels):
+        with self._lock:
+            self.counters[(metric, tuple(sorted(labels.items())))] += value
+
+    def export(self, event: dict):
+        kind, node = event['type'], event.get('node') or ''
+        if kind == 'node':
+            self._inc('graph_node_runs_total', 1, node=node, status=event['status'])
+            self._inc('graph_node_seconds_total', event['duration'], node=node)
+        elif kind == 'llm':
+            model = event.get('model') or ''
+            self._inc('llm_calls_total', 1, node=node, model=model, cache_hit=str(event['cache_hit']).lower())
+            self._inc('llm_seconds_total', event['duration'], node=node, model=model)
+            self._inc('llm_prompt_tokens_total', event['prompt_tokens'], node=node, model=model)
+            self._inc('llm_completion_tokens_total', event['completion_tokens'], node=node, model=model)
+            self._inc('llm_cost_usd_total', event['cost'], node=node, model=model)
+        elif kind == 'tool':
+            self._inc('tool_calls_total', 1, node=node, tool=event['name'], status=event['status'])
+            self._inc('tool_seconds_total', event['duration'], node=node, tool=event['name'])
+
+    def render(self) -> str:
+        with self._lock:
+            counters = dict(self.counters)
+        gauges = {
+            ('llm_cache_hits', ()): get_response_cache().hits,
+            ('llm_cache_misses', ()): get_response_cache().misses,
+        }
+        for key, value in fetch_metrics.summary().items():
+            gauges[(f'web_fetch_{key}', ())] = value
+        for key, value in dedup_totals.summary().items():
+            gauges[(f'dedup_{key}', ())] = value
+        for key, value in speculation_totals.summary().items():
+            gauges[(f'speculative_format_{key}', ())] = value
+        for route, values in get_rate_limiter().stats().items():
+            for key, value in values.items():
+                gauges[(f'rate_limit_{key}', (('route', route),))] = value
+
+        lines = []
+        for kind, metrics in (('counter', counters), ('gauge', gauges)):
+            for name in sorted({metric for metric, _ in metrics}):
+                lines.append(f'# TYPE {name} {kind}')
+                for (metric, labels), value in sorted(metrics.items()):
+                    if metric != name:
+                        continue
+                    label_text = ','.join(f'{key}="{val}"' for key, val in labels)
+                    lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class InstrumentationHandler(BaseCallbackHandler):
+    '''LangChain callback handler timing graph nodes, LLM calls and tool calls.
+
+    Events are attributed to a node through the ``langgraph_node`` metadata
+    LangGraph attaches to every child run, and to a report through the
+    ``report_run_id`` metadata set by ``instrumented_config``. Only per-run,
+    per-node totals are kept, for at most max_runs runs.
+    '''
+
+    # called synchronously so timings are not skewed by executor scheduling
+    run_inline = True
+
+    def __init__(self, exporters: list, max_runs: int = MAX_RUNS):
+        self.exporters = exporters
+        self.max_runs = max_runs
+        self._starts: dict[uuid.UUID, tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+        self._runs: OrderedDict[str | None, dict] = OrderedDict()
+
+    def _start(self, run_id, **info):
+        with self._lock:
+            self._starts[run_id] = (time.perf_counter(), info)
+
+    def _finish(self, run_id, **fields):
+        with self._lock:
+            started = self._starts.pop(run_id, None)
+        if started is None:
+            return
+        start_time, info = started
+        event = {**info, **fields, 'duration': time.perf_counter() - start_time, 'timestamp': time.time()}
+        self._aggregate(event)
+        for exporter in self.exporters:
+            exporter.export(event)
+
+    @staticmethod
+    def _context(metadata: dict | None) -> dict:
+        metadata = metadata or {}
+        return {'run': metadata.get('report_run_id'), 'node': metadata.get('langgraph_node')}
+
+    # graph nodes
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs: Any):
+        name = kwargs.get('name')
+        if metadata and name and name == metadata.get('langgraph_node') and not name.startswith('__'):
+            self._start(run_id, type='node', name=name, **self._context(metadata))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs: Any):
+        self._finish(run_id, status='ok')
+
+    def on_chain_error(self, error, *, run_id, **kwargs: Any):
+        self._finish(run_id, status='error', error=repr(error))
+
+    # LLM calls
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs: Any):
+        params = kwargs.get('invocation_params') or {}
+        model = (metadata or {}).get('ls_model_name') or params.get('model') or params.get('model_name')
+        self._start(run_id, type='llm', name=kwargs.get('name'), model=model, **self._context(metadata))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs: Any):
+        self.on_chat_model_start(serialized, [], run_id=run_id, metadata=metadata, **kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any):
+        with self._lock:
+            info = self._starts.get(run_id, (0, {}))[1]
+        cache_hit = _is_cache_hit(response)
+        prompt_tokens, completion_tokens = (0, 0) if cache_hit else _token_usage(response)
+        # routed models report the route that actually answered
+        model = (response.llm_output or {}).get('model_name') or info.get('model')
+        self._finish(
+            run_id,
+            status='ok',
+            model=model,
+            cache_hit=cache_hit,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost=estimate_cost(model, prompt_tokens, completion_tokens),
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any):
+        self._finish(
+            run_id, status='error', error=repr(error), cache_hit=False,
+            prompt_tokens=0, completion_tokens=0, cost=0.0,
+        )
+
+    # tool calls (research, Tavily, ...)
+    def on_tool_start(self, serialized, input_str, *, run_id, metadata=None, **kwargs: Any):
+        name = kwargs.get('name') or (serialized or {}).get('name')
+        self._start(run_id, type='tool', name=name, **self._context(metadata))
+
+    def on_tool_end(self, output, *, run_id, **kwargs: Any):
+        self._finish(run_id, status='ok')
+
+    def on_tool_error(self, error, *, run_id, **kwargs: Any):
+        self._finish(run_id, status='error', error=repr(error))
+
+    def _aggregate(self, event: dict):
+        with self._lock:
+            nodes = self._runs.get(event.get('run'))
+            if nodes is None:
+                nodes = self._runs[event.get('run')] = defaultdict(lambda: defaultdict(float))
+                while len(self._runs) > self.max_runs:
+                    self._runs.popitem(last=False)
+            self._runs.move_to_end(event.get('run'))
+            node = nodes[event.get('node') or event['name']]
+            if event['type'] == 'node':
+                node['wall_time'] += event['duration']
+                node['runs'] += 1
+            elif event['type'] == 'llm':
+                node['llm_time'] += event['duration']
+                node['llm_calls'] += 1
+                node['cache_hits'] += int(event['cache_hit'])
+                node['prompt_tokens'] += event['prompt_tokens']
+                node['completion_tokens'] += event['completion_tokens']
+                node['cost'] += event['cost']
+            elif event['type'] == 'tool':
+                node['tool_time'] += event['duration']
+                node['tool_calls'] += 1
+
+    def summarize(self, run: str | None = None) -> dict:
+        '''Per-node wall, LLM and tool time, tokens and cost for one run (or all kept runs).
+
+        A run's totals are dropped once it is summarized.
+        '''
+        with self._lock:
+            if run is not None:
+                runs = [self._runs.pop(run, {})]
+            else:
+                runs = list(self._runs.values())
+            totals = defaultdict(lambda: defaultdict(float))
+            for nodes in runs:
+                for name, values in nodes.items():
+                    for key, value in values.items():
+                        totals[name][key] += value
+        return {name: dict(values) for name, values in totals.items()}
+
+
+class Instrumentation:
+    def __init__(self, events_path: str | None = EVENTS_PATH):
+        self.prometheus = PrometheusExporter()
+        exporters = [self.prometheus]
+        if events_path:
+            exporters.append(JsonlExporter(events_path))
+        self.handler = InstrumentationHandler(exporters)
+        self._server = None
+
+    def config(self, run_id: str | None = None, config: dict | None = None) -> dict:
+        '''Runnable config that attaches the handler and tags events with run_id.'''
+        config = dict(config or {})
+        config['callbacks'] = [*(config.get('callbacks') or []), self.handler]
+        config['metadata'] = {**(config.get('metadata') or {}), 'report_run_id': run_id or str(uuid.uuid4())}
+        return config
+
+    def start_metrics_server(self, port: int = METRICS_PORT, host: str = '127.0.0.1'):
+        '''Serves the Prometheus text format on http://host:port/metrics from a daemon thread.'''
+        if self._server is not None:
+            return self._server
+        prometheus = self.prometheus
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = prometheus.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+
+_instrumentation = None
+
+
+def get_instrumentation() -> Instrumentation:
+    '''Returns the process-wide instrumentation, created on first use.'''
+    global _instrumentation
+    if _instrumentation is None:
+        _instrumentation = Instrumentation()
+    return _instrumentation
+
+
+def instrumented_config(run_id: str | None = None, config: dict | None = None) -> dict:
+    return get_instrumentation().config(run_id, config)
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+# Exact-match cache for LLM responses, shared by every model built via models.LLM.
+CACHE_PATH = os.path.join('.cache', 'llm.sqlite')
+CACHE_TTL = 7 * 24 * 60 * 60
+MEMORY_MAX_ENTRIES = 512
+DISK_MAX_ENTRIES = 20000
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    # llm_string carries provider class, model name and call kwargs such as
+    # bound functions; prompt is the serialized, fully rendered messages.
+    return hashlib.sha256(f'{llm_string}\x00{prompt}'.encode('utf-8')).hexdigest()
+
+
+def _mark_cached(return_val: RETURN_VAL_TYPE) -> RETURN_VAL_TYPE:
+    # lets callbacks (see instrumentation) tell cache hits from provider calls
+    return [
+        generation.copy(update={'generation_info': {**(generation.generation_info or {}), 'cache_hit': True}})
+        for generation in return_val
+    ]
+
+
+def _serialize(return_val: RETURN_VAL_TYPE) -> str:
+    return dumps(list(return_val))
+
+
+def _deserialize(payload: str) -> RETURN_VAL_TYPE:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return loads(payload)
+
+
+class MemoryTier:
+    '''In-process LRU with TTL.'''
+
+    def __init__(self, max_entries: int = MEMORY_MAX_ENTRIES, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, RETURN_VAL_TYPE]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, value = entry
+            if time.time() - created_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: RETURN_VAL_TYPE, created_at: float | None = None):
+        with self._lock:
+            self._entries[key] = (created_at or time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteTier:
+    '''On-disk tier that survives restarts, bounded by entry count and TTL.'''
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = DISK_MAX_ENTRIES, ttl: float = CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )'''
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[tuple[float, str]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT payload, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            payload, created_at = row
+            if now - created_at > self.ttl:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+        return created_at, payload
+
+    def set(self, key: str, payload: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)', (key, payload, now, now)
+            )
+            self._conn.execute(
+                '''DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )''',
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+
+class ResponseCache(BaseCache):
+    '''Two-tier (memory LRU, then SQLite) exact-match LLM response cache.
+
+    Plugs into LangChain's chat model ``cache`` hook, so lookups happen
+    before any provider request and misses are stored after it.
+    '''
+
+    def __init__(self, memory: MemoryTier | None = None, disk: SQLiteTier | None = None):
+        self.memory = memory if memory is not None else MemoryTier()
+        self.disk = disk
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            if counter != 'misses':
+                self.hits += 1
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = cache_key(prompt, llm_string)
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+        if self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                created_at, payload = row
+                value = _deserialize(payload)
+                self.memory.set(key, value, created_at)
+                self._count('disk_hits')
+                return value
+        self._count('misses')
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = cache_key(prompt, llm_string)
+        return_val = _mark_cached(return_val)
+        self.memory.set(key, return_val)
+        if self.disk is not None:
+            self.disk.set(key, _serialize(return_val))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+_cache = None
+
+
+def get_response_cache() -> ResponseCache:
+    '''Returns the process-wide response cache (memory + SQLite tiers).'''
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(MemoryTier(), SQLiteTier())
+    return _cache
+
+
+def set_response_cache(cache: ResponseCache | None):
+    '''Replaces the shared cache, e.g. with a memory-only or differently sized one.'''
+    global _cache
+    _cache = cache
@@ -1,27 +1,456 @@
-from langchain_groq import ChatGroq
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_mistralai import ChatMistralAI
-from langchain_anthropic import ChatAnthropic
-from langchain_openai import ChatOpenAI
+import asyncio
+import collections
+import functools
+import importlib
+import json
+import threading
+import time
+import warnings
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, BaseMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import Field
+
+from llm_cache import get_response_cache
+from rate_limit import COMPLETION_TOKENS, get_rate_limiter, is_rate_limited, retry_after
+from tokens import estimate_tokens
+
+# api_services -> (module, chat model class, keyword used for the model name).
+# Provider SDKs are imported only when a model from them is requested.
+PROVIDERS = {
+    'groq': ('langchain_groq', 'ChatGroq', 'model'),
+    'google': ('langchain_google_genai', 'ChatGoogleGenerativeAI', 'model'),
+    'anthropic': ('langchain_anthropic', 'ChatAnthropic', 'model_name'),
+    'mistral': ('langchain_mistralai', 'ChatMistralAI', 'model_name'),
+    'openai': ('langchain_openai', 'ChatOpenAI', 'model'),
+}
+
+
+# extra constructor arguments per provider
+PROVIDER_OPTIONS = {
+    'anthropic': {'default_headers': {'anthropic-beta': 'prompt-caching-2024-07-31'}},
+}
+# providers whose prompt caching needs explicit breakpoints; the others
+# (OpenAI, Groq, ...) cache prompt prefixes on their own or not at all
+CACHE_BREAKPOINT_PROVIDERS = {'anthropic'}
+
+
+def with_cache_breakpoints(messages: List[BaseMessage], api_services) -> List[BaseMessage]:
+    '''Messages marked with additional_kwargs['cache_control'] (see prompt_agents.layout)
+    in the provider's breakpoint format; unchanged for providers without one.'''
+    if api_services not in CACHE_BREAKPOINT_PROVIDERS:
+        return messages
+    converted = []
+    for message in messages:
+        cache_control = message.additional_kwargs.get('cache_control')
+        if cache_control and isinstance(message.content, str):
+            message = message.copy(update={
+                'content': [{'type': 'text', 'text': message.content, 'cache_control': cache_control}],
+                'additional_kwargs': {k: v for k, v in message.additional_kwargs.items() if k != 'cache_control'},
+            })
+        converted.append(message)
+    return converted
+
+
+def load_chat_model_class(api_services):
+    if api_services not in PROVIDERS:
+        raise ValueError(f'API SERVICE NOT SUPPORTED: {api_services}')
+    module_name, class_name, _ = PROVIDERS[api_services]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+# seconds without an answer before a duplicate request goes to the next route,
+# until the route has MIN_LATENCY_SAMPLES answers to derive it from
+HEDGE_AFTER = 8.0
+# afterwards a call is hedged once it is slower than this share of the route's
+# recent answers, so long generations that are normal for it are left alone
+HEDGE_PERCENTILE = 0.95
+LATENCY_WINDOW = 100
+MIN_LATENCY_SAMPLES = 10
+MIN_HEDGE_AFTER = 1.0
+# consecutive failures that take a route out of rotation, and for how long
+FAILURE_THRESHOLD = 3
+COOLDOWN = 60.0
+# a route this many times slower than the fastest one is tried after it for COOLDOWN seconds
+SLOW_FACTOR = 4.0
+
+
+def route_name(api_services, model_name) -> str:
+    return f'{api_services}:{model_name}'
+
+
+class ProviderHealth:
+    '''Process-wide failure and latency tracking per route.
+
+    A route that fails FAILURE_THRESHOLD times in a row is skipped for
+    COOLDOWN seconds, and one that is SLOW_FACTOR times slower than the
+    fastest of its alternatives is moved behind them for as long; routes are
+    otherwise ordered as configured.
+    '''
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN,
+                 slow_factor: float = SLOW_FACTOR):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_factor = slow_factor
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+        self._latencies: dict[str, collections.deque] = {}
+
+    def _entry(self, name: str) -> dict:
+        return self._stats.setdefault(name, {
+            'successes': 0, 'failures': 0, 'consecutive_failures': 0,
+            'hedges': 0, 'latency': None, 'down_until': 0.0, 'slow_until': 0.0,
+        })
+
+    def available(self, name: str) -> bool:
+        with self._lock:
+            return self._entry(name)['down_until'] <= time.monotonic()
+
+    def record_success(self, name: str, latency: float):
+        with self._lock:
+            entry = self._entry(name)
+            entry['successes'] += 1
+            entry['consecutive_failures'] = 0
+            entry['down_until'] = 0.0
+            self._record_latency(name, latency)
+
+    def record_latency(self, name: str, latency: float):
+        '''Latency of a call that lost a hedge race and was cancelled (a lower bound).'''
+        with self._lock:
+            self._record_latency(name, latency)
+
+    def _record_latency(self, name: str, latency: float):
+        entry = self._entry(name)
+        # exponentially weighted, so recent slowness shows quickly
+        entry['latency'] = latency if entry['latency'] is None else 0.8 * entry['latency'] + 0.2 * latency
+        self._latencies.setdefault(name, collections.deque(maxlen=LATENCY_WINDOW)).append(latency)
+
+    def record_failure(self, name: str):
+        with self._lock:
+            entry = self._entry(name)
+            entry['failures'] += 1
+            entry['consecutive_failures'] += 1
+            if entry['consecutive_failures'] >= self.failure_threshold:
+                entry['down_until'] = time.monotonic() + self.cooldown
+
+    def record_hedge(self, name: str):
+        with self._lock:
+            self._entry(name)['hedges'] += 1
+
+    def hedge_delay(self, name: str, default: float) -> float:
+        '''Seconds to wait for name before hedging: the HEDGE_PERCENTILE of its recent latencies.'''
+        with self._lock:
+            latencies = sorted(self._latencies.get(name, ()))
+        if len(latencies) < MIN_LATENCY_SAMPLES:
+            return default
+        return max(MIN_HEDGE_AFTER, latencies[min(len(latencies) - 1, int(HEDGE_PERCENTILE * len(latencies)))])
+
+    def order(self, names: list[str]) -> list[str]:
+        '''Available routes first, then ones that are not slow, keeping the configured order within each group.'''
+        now = time.monotonic()
+        with self._lock:
+            entries = {name: self._entry(name) for name in names}
+            fastest = min(
+                (entry['latency'] for entry in entries.values() if entry['latency'] is not None and entry['down_until'] <= now),
+                default=None,
+            )
+            for entry in entries.values():
+                if fastest is not None and entry['latency'] is not None and entry['latency'] > self.slow_factor * fastest:
+                    entry['slow_until'] = now + self.cooldown
+                    # measured afresh once it is tried first again
+                    entry['latency'] = None
+            return sorted(names, key=lambda name: (entries[name]['down_until'] > now, entries[name]['slow_until'] > now))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._stats.items()}
+
+
+provider_health = ProviderHealth()
+
+
+def _reserved_tokens(messages: List[BaseMessage], kwargs: dict) -> int:
+    prompt = ''.join(str(message.content) for message in messages)
+    prompt += json.dumps(kwargs.get('functions') or kwargs.get('tools') or '', default=str)
+    return estimate_tokens(prompt) + (kwargs.get('max_tokens') or COMPLETION_TOKENS)
+
+
+def _used_tokens(message: BaseMessage, reserved: int) -> int:
+    usage = getattr(message, 'usage_metadata', None)
+    return usage['total_tokens'] if usage else reserved
+
+
+def _as_chunk(message: BaseMessage) -> BaseMessageChunk:
+    '''A whole answer (from a route that does not stream) as a single chunk.'''
+    if isinstance(message, BaseMessageChunk):
+        return message
+    return AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=getattr(message, 'usage_metadata', None),
+        tool_call_chunks=[
+            {'name': call['name'], 'args': json.dumps(call['args']), 'id': call['id'], 'index': index}
+            for index, call in enumerate(getattr(message, 'tool_calls', None) or [])
+        ],
+    )
+
+
+# route models run without callbacks: the routed model's own run reports the
+# call, so handlers would otherwise see (and count, or stream) it twice
+ROUTE_CONFIG = {'callbacks': []}
+
+
+class RoutedChatModel(BaseChatModel):
+    '''Chat model that spreads one logical model over several provider routes.
+
+    Every call waits for its route's budget in the shared rate limiter.
+    Calls go to the first healthy route. If it has not answered within its
+    usual latency (see ProviderHealth.hedge_delay; hedge_after until that is
+    known, None disables hedging) after being admitted by the limiter (time
+    queued locally is not provider latency), the same request is also sent to the next route and
+    the first answer wins; the slower request is cancelled. Errors fail over
+    to the remaining routes. Call kwargs (bound functions, tools, stop) are
+    forwarded unchanged, so ``.bind(...)`` works as on a single provider.
+
+    Calls stream only when a streaming handler asks for it (see
+    streaming.StreamTokens); streamed calls fail over until the first token
+    but are never hedged.
+    '''
+
+    routes: List[BaseChatModel]
+    route_names: List[str]
+    hedge_after: Optional[float] = HEDGE_AFTER
+    health: Any = Field(default_factory=lambda: provider_health, exclude=True)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self) -> str:
+        return 'routed-chat'
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {'routes': self.route_names}
+
+    def _get_ls_params(self, stop: Optional[List[str]] = None, **kwargs: Any):
+        params = super()._get_ls_params(stop=stop, **kwargs)
+        params['ls_model_name'] = self.route_names[0].split(':', 1)[1]
+        return params
+
+    def _combine_llm_outputs(self, llm_outputs: List[Optional[dict]]) -> dict:
+        return next((output for output in llm_outputs if output), {})
+
+    def _ordered_routes(self) -> list[tuple[str, BaseChatModel]]:
+        by_name = dict(zip(self.route_names, self.routes))
+        return [(name, by_name[name]) for name in self.health.order(list(self.route_names))]
+
+    async def _admit(self, name, messages, kwargs) -> tuple:
+        '''Waits for the route's budget; returns (limiter, reserved tokens, messages for the route).'''
+        messages = with_cache_breakpoints(messages, name.split(':', 1)[0])
+        limiter = get_rate_limiter().route(name)
+        reserved = _reserved_tokens(messages, kwargs)
+        if limiter:
+            await limiter.acquire(reserved)
+        return limiter, reserved, messages
+
+    async def _acall_admitted(self, model, admission, stop, kwargs) -> BaseMessage:
+        limiter, reserved, messages = admission
+        try:
+            message = await model.ainvoke(messages, ROUTE_CONFIG, stop=stop, **kwargs)
+        except Exception as error:
+            if limiter and is_rate_limited(error):
+                limiter.penalize(retry_after(error))
+            raise
+        if limiter:
+            limiter.settle(reserved, _used_tokens(message, reserved))
+        return message
+
+    def _call_route(self, name, model, messages, stop, kwargs) -> BaseMessage:
+        messages = with_cache_breakpoints(messages, name.split(':', 1)[0])
+        limiter = get_rate_limiter().route(name)
+        reserved = _reserved_tokens(messages, kwargs)
+        if limiter:
+            limiter.acquire_sync(reserved)
+        try:
+            message = model.invoke(messages, ROUTE_CONFIG, stop=stop, **kwargs)
+        except Exception as error:
+            if limiter and is_rate_limited(error):
+                limiter.penalize(retry_after(error))
+            raise
+        if limiter:
+            limiter.settle(reserved, _used_tokens(message, reserved))
+        return message
+
+    def _should_stream(self, *, async_api: bool, run_manager=None, **kwargs: Any) -> bool:
+        # astream() (which agents use for every step) passes stream=True; ignoring
+        # it sends those calls through ainvoke and so through the response cache
+        kwargs.pop('stream', None)
+        return run_manager is not None and super()._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+    @staticmethod
+    def _result(name: str, message: BaseMessage) -> ChatResult:
+        return ChatResult(
+            generations=[ChatGeneration(message=message, generation_info={'route': name})],
+            llm_output={'route': name, 'model_name': name.split(':', 1)[1]},
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # no hedging without an event loop; failover only
+        errors = []
+        for name, model in self._ordered_routes():
+            started = time.monotonic()
+            try:
+                message = self._call_route(name, model, messages, stop, kwargs)
+            except Exception as error:
+                self.health.record_failure(name)
+                errors.append(error)
+                continue
+            self.health.record_success(name, time.monotonic() - started)
+            return self._result(name, message)
+        raise errors[-1]
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        pending_routes = self._ordered_routes()
+        # routes waiting for their rate limit budget, and calls in flight
+        admitting: dict[asyncio.Task, tuple[str, BaseChatModel]] = {}
+        running: dict[asyncio.Task, tuple[str, float]] = {}
+        hedge_at = None
+        errors = []
+
+        def admit():
+            name, model = pending_routes.pop(0)
+            admitting[asyncio.create_task(self._admit(name, messages, kwargs))] = (name, model)
+
+        admit()
+        try:
+            while admitting or running:
+                timeout = None
+                if hedge_at is not None and pending_routes and not admitting:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait([*admitting, *running], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # slow answer: race the next route against the ones in flight
+                    self.health.record_hedge(pending_routes[0][0])
+                    hedge_at = None
+                    admit()
+                    continue
+                for task in done:
+                    if task in admitting:
+                        name, model = admitting.pop(task)
+                        call = asyncio.create_task(self._acall_admitted(model, task.result(), stop, kwargs))
+                        running[call] = (name, time.monotonic())
+                        # the hedge clock starts once the newest route is admitted
+                        if self.hedge_after is not None:
+                            hedge_at = time.monotonic() + self.health.hedge_delay(name, self.hedge_after)
+                        continue
+                    name, started = running.pop(task)
+                    if task.exception() is None:
+                        self.health.record_success(name, time.monotonic() - started)
+                        for other_name, other_started in running.values():
+                            # so a route that keeps losing races is seen to be slow
+                            self.health.record_latency(other_name, time.monotonic() - other_started)
+                        return self._result(name, task.result())
+                    self.health.record_failure(name)
+                    errors.append(task.exception())
+                if not admitting and not running and pending_routes:
+                    admit()
+            raise errors[-1]
+        finally:
+            for task in running:
+                task.cancel()
+            for task in admitting:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    # admitted but never sent: give the budget back
+                    limiter, reserved, _ = task.result()
+                    if limiter:
+                        limiter.settle(reserved, 0)
+                task.cancel()
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        errors = []
+        for name, model in self._ordered_routes():
+            route_messages = with_cache_breakpoints(messages, name.split(':', 1)[0])
+            limiter = get_rate_limiter().route(name)
+            reserved = _reserved_tokens(route_messages, kwargs)
+            if limiter:
+                await limiter.acquire(reserved)
+            started = time.monotonic()
+            message = None
+            try:
+                async for chunk in model.astream(route_messages, ROUTE_CONFIG, stop=stop, **kwargs):
+                    chunk = _as_chunk(chunk)
+                    message = chunk if message is None else message + chunk
+                    yield ChatGenerationChunk(message=chunk, generation_info={'route': name})
+            except Exception as error:
+                if limiter and is_rate_limited(error):
+                    limiter.penalize(retry_after(error))
+                self.health.record_failure(name)
+                if message is not None:
+                    # part of the answer has been streamed; another route cannot continue it
+                    raise
+                errors.append(error)
+                continue
+            if limiter:
+                limiter.settle(reserved, _used_tokens(message, reserved))
+            self.health.record_success(name, time.monotonic() - started)
+            return
+        raise errors[-1]
+
 
 class LLM:
-    def __init__(self, api_services, model_name):
-        if api_services == 'groq':
-            llm = ChatGroq(model = model_name)
-        elif api_services == 'google':
-            llm = ChatGoogleGenerativeAI(model= model_name)
-        elif api_services == 'anthropic':
-            llm = ChatAnthropic(model_name=model_name)
-        elif api_services == 'mistral':
-            llm = ChatMistralAI(model_name=model_name)
-        elif api_services == 'openai': 
-            llm = ChatOpenAI(model=model_name)
-        else:
-            print('API SERVICE NOT SUPPORTED')
-
-        self.llm = llm
+    def __init__(self, api_services, model_name, cache=None, fallbacks=(), hedge_after=HEDGE_AFTER):
+        # cache: a langchain BaseCache, False to disable, None for the shared response cache
+        # fallbacks: (api_services, model_name) routes used for hedging and failover
+        if cache is None:
+            cache = get_response_cache()
+        routes, names = [], []
+        for route_api, route_model in [(api_services, model_name), *fallbacks]:
+            try:
+                # cached once for the routed call, not per route
+                routes.append(self._chat_model(route_api, route_model, cache=False))
+            except Exception as error:
+                if not routes:
+                    raise
+                # a missing SDK or API key only removes that fallback
+                warnings.warn(f'Skipping fallback {route_name(route_api, route_model)}: {error}')
+                continue
+            names.append(route_name(route_api, route_model))
+
+        # a single route still goes through the wrapper for rate limiting
+        self.llm = RoutedChatModel(routes=routes, route_names=names, hedge_after=hedge_after, cache=cache)
+        self.model_name = model_name
         self.api_services = api_services
     
+    @staticmethod
+    def _chat_model(api_services, model_name, cache):
+        chat_model_class = load_chat_model_class(api_services)
+        model_kwarg = PROVIDERS[api_services][2]
+        return chat_model_class(**{model_kwarg: model_name}, **PROVIDER_OPTIONS.get(api_services, {}), cache=cache)
+
     def get_llm(self):
         return self.llm
     
@@ -32,4 +461,7 @@ class LLM:
             print('Not Suppoted in Google!!')
 
 
-    
\ No newline at end of file
+@functools.lru_cache(maxsize=None)
+def shared_llm(api_services, model_name, fallbacks=()) -> LLM:
+    '''Returns one LLM per (provider, model, fallbacks), created on first use and shared by callers.'''
+    return LLM(api_services, model_name, fallbacks=fallbacks)
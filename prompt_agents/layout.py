@@ -0,0 +1,25 @@
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+# Prompts are laid out for provider-side prompt caching: the static
+# instructions come first, as one literal system message shared by every
+# call, and the per-call inputs follow in a human message. Providers with
+# automatic prefix caching reuse the system prefix as it is; providers that
+# need explicit breakpoints get one at its end (see models.with_cache_breakpoints).
+CACHE_CONTROL = {'type': 'ephemeral'}
+
+
+def static_system_message(instructions: str) -> SystemMessage:
+    '''Instructions as a ready-made system message marked as a cache breakpoint.
+
+    It is not a template, so it is built once and sent byte-for-byte the same.
+    '''
+    return SystemMessage(content=instructions.strip(), additional_kwargs={'cache_control': CACHE_CONTROL})
+
+
+def cached_prompt(instructions: str, inputs: str, agent: bool = False) -> ChatPromptTemplate:
+    '''Static instructions, then the inputs template (then the agent scratchpad for tool agents).'''
+    messages = [static_system_message(instructions), ('human', inputs.strip())]
+    if agent:
+        messages.append(MessagesPlaceholder(variable_name='agent_scratchpad'))
+    return ChatPromptTemplate.from_messages(messages)
@@ -0,0 +1,223 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+# Process-wide request and token budgets per provider route, shared by every
+# graph run so concurrent runs queue locally instead of tripping 429s.
+
+# priorities: lower goes first
+INTERACTIVE = 0
+DEFAULT = 1
+BATCH = 2
+
+# seconds to hold a route back after a 429 without a Retry-After header
+RATE_LIMIT_PENALTY = 10.0
+# how a 429 reads in error text: "Error 429: ..." (aiohttp callers) or
+# "429 Client Error: ..." (requests' HTTPError)
+RATE_LIMITED_TEXT = re.compile(r'\bError 429\b|\b429 (?:Client Error|Too Many Requests)\b', re.IGNORECASE)
+# completion tokens reserved per LLM call until the real usage is known
+COMPLETION_TOKENS = 1024
+
+
+@dataclass(frozen=True)
+class Budget:
+    rpm: float | None = None  # requests per minute
+    tpm: float | None = None  # tokens per minute
+
+
+# route name ('provider:model', see models.route_name) -> budget
+LIMITS = {
+    'groq:llama-3.1-70b-versatile': Budget(rpm=30, tpm=6000),
+    'groq:llama-3.1-8b-instant': Budget(rpm=30, tpm=20000),
+    'openai:gpt-4o-mini': Budget(rpm=500, tpm=200000),
+    'openai:gpt-4o': Budget(rpm=500, tpm=30000),
+    'anthropic:claude-3-5-sonnet-20240620': Budget(rpm=50, tpm=40000),
+    'anthropic:claude-3-haiku-20240307': Budget(rpm=50, tpm=50000),
+    'tavily:search': Budget(rpm=100),
+}
+
+_priority = contextvars.ContextVar('rate_limit_priority', default=DEFAULT)
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    '''Runs the calls made inside the block (and tasks started from it) at level.'''
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class TokenBucket:
+    '''Refills continuously up to one minute of budget; may go into debt.'''
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # oversized requests wait for a full bucket rather than forever
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+class RouteLimiter:
+    '''Admits calls to one route in priority order within its budget.'''
+
+    def __init__(self, budget: Budget):
+        self.requests = TokenBucket(budget.rpm) if budget.rpm else None
+        self.tokens = TokenBucket(budget.tpm) if budget.tpm else None
+        self.blocked_until = 0.0
+        self.queued = 0
+        self.throttled = 0
+        self._waiting: list[tuple[int, int]] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _delay(self, ticket, tokens: int) -> float | None:
+        '''Takes the budget and returns None if ticket may go now, else seconds to wait.'''
+        with self._lock:
+            now = time.monotonic()
+            for bucket in (self.requests, self.tokens):
+                if bucket:
+                    bucket.refill(now)
+            waits = [self.blocked_until - now]
+            if self.requests:
+                waits.append(self.requests.wait_time(1))
+            if self.tokens:
+                waits.append(self.tokens.wait_time(tokens))
+            delay = max(waits)
+            if self._waiting[0] != ticket:
+                # behind a higher-priority or earlier call; poll until it is our turn
+                return min(max(delay, 0.01), 0.25)
+            if delay > 0:
+                return delay
+            heapq.heappop(self._waiting)
+            if self.requests:
+                self.requests.level -= 1
+            if self.tokens:
+                self.tokens.level -= tokens
+            return None
+
+    def _enqueue(self, level: int):
+        ticket = (level, next(self._counter))
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _dequeue(self, ticket):
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+
+    async def acquire(self, tokens: int = 0, level: int | None = None):
+        ticket = self._enqueue(current_priority() if level is None else level)
+        try:
+            delay = self._delay(ticket, tokens)
+            if delay is not None:
+                self.queued += 1
+            while delay is not None:
+                await asyncio.sleep(delay)
+                delay = self._delay(ticket, tokens)
+        finally:
+            self._dequeue(ticket)
+
+    def acquire_sync(self, tokens: int = 0, level: int | None = None):
+        ticket = self._enqueue(current_priority() if level is None else level)
+        try:
+            delay = self._delay(ticket, tokens)
+            if delay is not None:
+                self.queued += 1
+            while delay is not None:
+                time.sleep(delay)
+                delay = self._delay(ticket, tokens)
+        finally:
+            self._dequeue(ticket)
+
+    def settle(self, reserved: int, used: int):
+        '''Corrects the token bucket once the real usage of a call is known.'''
+        if self.tokens:
+            with self._lock:
+                self.tokens.level -= used - reserved
+
+    def penalize(self, retry_after: float | None = None):
+        with self._lock:
+            self.throttled += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + (retry_after or RATE_LIMIT_PENALTY))
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    '''True for 429s from provider SDKs, requests' HTTPError and errors known only by their text.'''
+    status = (
+        getattr(error, 'status_code', None) or getattr(error, 'status', None)
+        or getattr(getattr(error, 'response', None), 'status_code', None)
+    )
+    return status == 429 or RATE_LIMITED_TEXT.search(str(error)) is not None
+
+
+def retry_after(error: BaseException) -> float | None:
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    '''Registry of route limiters; routes without a configured budget are not limited.'''
+
+    def __init__(self, limits: dict[str, Budget] | None = None):
+        self.limits = dict(LIMITS if limits is None else limits)
+        self._routes: dict[str, RouteLimiter] = {}
+        self._lock = threading.Lock()
+
+    def route(self, name: str) -> RouteLimiter | None:
+        budget = self.limits.get(name)
+        if budget is None:
+            return None
+        with self._lock:
+            if name not in self._routes:
+                self._routes[name] = RouteLimiter(budget)
+            return self._routes[name]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {'queued': limiter.queued, 'throttled': limiter.throttled}
+                for name, limiter in self._routes.items()
+            }
+
+
+_limiter = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    '''Returns the process-wide rate limiter, created on first use.'''
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
+
+
+def set_rate_limiter(limiter: RateLimiter | None):
+    '''Replaces the shared limiter, e.g. with budgets for a paid tier.'''
+    global _limiter
+    _limiter = limiter
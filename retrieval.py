@@ -0,0 +1,189 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+
+from tokens import estimate_tokens
+from tools.page_cache import site_key
+
+# BM25 index over scraped brand pages, so nodes send the LLM the passages
+# relevant to their task instead of every page.
+CHUNK_TOKENS = 200
+RETRIEVAL_TOP_K = 12
+RETRIEVAL_TOKEN_BUDGET = 1500
+MAX_INDEXED_SITES = 256  # least recently used site indexes are dropped beyond this
+BM25_K1 = 1.5
+BM25_B = 0.75
+TERM = re.compile(r'\w+')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or our that the their this to '
+    'was we with you your will can all any more most not no'.split()
+)
+
+
+def terms(text: str) -> list[str]:
+    return [term for term in TERM.findall(text.lower()) if term not in STOPWORDS]
+
+
+@dataclass
+class Passage:
+    source: str
+    position: int  # order within the source page
+    text: str
+    tokens: int
+
+
+def chunk_text(text: str, source: str, max_tokens: int = CHUNK_TOKENS) -> list[Passage]:
+    '''Groups consecutive lines (blocks, see tools.parsing) into passages of about max_tokens.'''
+    passages, lines, size = [], [], 0
+
+    def flush():
+        if lines:
+            chunk = '\n'.join(lines)
+            passages.append(Passage(source, len(passages), chunk, estimate_tokens(chunk)))
+
+    for line in text.split('\n'):
+        line_tokens = estimate_tokens(line)
+        if lines and size + line_tokens > max_tokens:
+            flush()
+            lines, size = [], 0
+        # a single oversized line is split on words
+        while line_tokens > max_tokens:
+            cut = line.rfind(' ', 0, max_tokens * 4)
+            cut = cut if cut > 0 else max_tokens * 4
+            lines.append(line[:cut])
+            flush()
+            lines, size = [], 0
+            line = line[cut:].strip()
+            line_tokens = estimate_tokens(line)
+        if line:
+            lines.append(line)
+            size += line_tokens
+    flush()
+    return passages
+
+
+class BM25Index:
+    '''Okapi BM25 over passages; re-adding a source replaces its passages.'''
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.passages: dict[int, Passage] = {}
+        self._lengths: dict[int, int] = {}
+        self._terms: dict[int, list[str]] = {}
+        self._postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self._by_source: dict[str, list[int]] = {}
+        self._digests: dict[str, str] = {}
+        self._next_id = 0
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def _remove_source(self, source: str):
+        for passage_id in self._by_source.pop(source, []):
+            self.passages.pop(passage_id)
+            self._total_length -= self._lengths.pop(passage_id)
+            for term in self._terms.pop(passage_id):
+                postings = self._postings[term]
+                del postings[passage_id]
+                if not postings:
+                    del self._postings[term]
+
+    def add(self, source: str, text: str, chunk_tokens: int = CHUNK_TOKENS):
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        with self._lock:
+            if self._digests.get(source) == digest:
+                return
+            self._remove_source(source)
+            self._digests[source] = digest
+            ids = []
+            for passage in chunk_text(text, source, chunk_tokens):
+                passage_id = self._next_id
+                self._next_id += 1
+                counts = Counter(terms(passage.text))
+                self.passages[passage_id] = passage
+                self._lengths[passage_id] = sum(counts.values())
+                self._terms[passage_id] = list(counts)
+                self._total_length += self._lengths[passage_id]
+                for term, count in counts.items():
+                    self._postings[term][passage_id] = count
+                ids.append(passage_id)
+            self._by_source[source] = ids
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> list[tuple[float, Passage]]:
+        with self._lock:
+            if not self.passages:
+                return []
+            count = len(self.passages)
+            average_length = self._total_length / count or 1
+            scores: dict[int, float] = defaultdict(float)
+            for term in set(terms(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for passage_id, frequency in postings.items():
+                    length_norm = 1 - self.b + self.b * self._lengths[passage_id] / average_length
+                    scores[passage_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+            best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+            return [(score, self.passages[passage_id]) for passage_id, score in best]
+
+
+class SiteIndexes:
+    '''One BM25 index per site (see tools.page_cache.site_key), fed by the research tool.'''
+
+    def __init__(self, max_sites: int = MAX_INDEXED_SITES):
+        self.max_sites = max_sites
+        self._indexes: OrderedDict[str, BM25Index] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def index(self, site: str) -> BM25Index:
+        with self._lock:
+            if site not in self._indexes:
+                self._indexes[site] = BM25Index()
+                while len(self._indexes) > self.max_sites:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end(site)
+            return self._indexes[site]
+
+    def add(self, url: str, text: str):
+        self.index(site_key(url)).add(url, text)
+
+    def retrieve(self, urls: list[str], query: str, token_budget: int = RETRIEVAL_TOKEN_BUDGET,
+                 k: int = RETRIEVAL_TOP_K) -> list[Passage]:
+        '''Best passages from the sites of urls that fit in token_budget, in page order.'''
+        sites = {site_key(url) for url in urls}
+        with self._lock:
+            indexes = [self._indexes[site] for site in sites if site in self._indexes]
+            for site in sites & self._indexes.keys():
+                self._indexes.move_to_end(site)
+        ranked = sorted(
+            (hit for index in indexes for hit in index.search(query, k)), key=lambda hit: -hit[0]
+        )
+        selected, used = [], 0
+        for _, passage in ranked[:k]:
+            if used + passage.tokens > token_budget:
+                continue
+            selected.append(passage)
+            used += passage.tokens
+        return sorted(selected, key=lambda passage: (passage.source, passage.position))
+
+
+_indexes = None
+
+
+def get_site_indexes() -> SiteIndexes:
+    '''Returns the process-wide site indexes, created on first use.'''
+    global _indexes
+    if _indexes is None:
+        _indexes = SiteIndexes()
+    return _indexes
+
+
+def format_passages(passages: list[Passage]) -> str:
+    return '\n\n'.join(f'Source: {passage.source}\n{passage.text}' for passage in passages)
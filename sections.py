@@ -0,0 +1,101 @@
+import re
+
+# Splitting agent outputs into per-goal sections so revisions can replace
+# only the sections the quality checker rejected.
+HEADING = re.compile(r'^(#{1,6})\s+(.*\S)\s*$', re.MULTILINE)
+GOAL_LINE = re.compile(r'^.*?\bGoal\s*:\**\s*(.*\S)\s*$', re.MULTILINE | re.IGNORECASE)
+
+
+def _normalize(title: str) -> str:
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', title.lower()).split())
+
+
+def titles_match(title: str, wanted: str) -> bool:
+    title, wanted = _normalize(title), _normalize(wanted)
+    return bool(title and wanted) and (wanted in title or title in wanted)
+
+
+def split_sections(text: str) -> list[tuple[str, str]]:
+    '''Splits markdown into (title, chunk) pairs.
+
+    Sections start at the outermost heading level that occurs more than
+    once (so a single document title is not treated as the only section),
+    or at "Goal: ..." lines when there are no headings. Text before the
+    first section is returned with an empty title. Joining the chunks
+    reproduces the input.
+    '''
+    headings = list(HEADING.finditer(text))
+    markers = []
+    if headings:
+        levels = sorted({len(match.group(1)) for match in headings})
+        level = levels[0]
+        for candidate in levels:
+            level = candidate
+            if sum(len(match.group(1)) == candidate for match in headings) > 1:
+                break
+        markers = [(match.start(), match.group(2)) for match in headings if len(match.group(1)) == level]
+    else:
+        markers = [(match.start(), match.group(1)) for match in GOAL_LINE.finditer(text)]
+
+    if not markers:
+        return [('', text)]
+    sections = []
+    if markers[0][0] > 0:
+        sections.append(('', text[:markers[0][0]]))
+    for index, (start, title) in enumerate(markers):
+        end = markers[index + 1][0] if index + 1 < len(markers) else len(text)
+        sections.append((title.strip('*#: '), text[start:end]))
+    return sections
+
+
+def select_sections(text: str, titles: list[str]) -> str:
+    '''Returns only the sections of text whose titles match one of titles.'''
+    return ''.join(
+        chunk for title, chunk in split_sections(text)
+        if any(titles_match(title, wanted) for wanted in titles)
+    )
+
+
+def splice_sections(previous: str, revised: str, titles: list[str]) -> str:
+    '''Replaces the sections of previous named in titles with revised ones.
+
+    Revised sections are matched by title; a revision without recognisable
+    sections replaces the body of the single requested section. A section
+    replaced by a revision under another title keeps its original heading,
+    so later lookups by title still find it. Revised sections with no
+    counterpart in previous are appended.
+    '''
+    revised_sections = [(title, chunk) for title, chunk in split_sections(revised) if title]
+    headless = not revised_sections
+    if headless:
+        if len(titles) != 1:
+            return previous
+        revised_sections = [(titles[0], revised)]
+
+    used = set()
+    merged = []
+    for title, chunk in split_sections(previous):
+        replacement = None
+        if title and any(titles_match(title, wanted) for wanted in titles):
+            for index, (revised_title, revised_chunk) in enumerate(revised_sections):
+                if index not in used and titles_match(revised_title, title):
+                    replacement = _under_heading(chunk, revised_chunk, has_heading=False) if headless else revised_chunk
+                    used.add(index)
+                    break
+            if replacement is None and len(titles) == 1 and len(revised_sections) == 1 and 0 not in used:
+                replacement = _under_heading(chunk, revised_sections[0][1], has_heading=not headless)
+                used.add(0)
+        merged.append(_with_newline(replacement if replacement is not None else chunk))
+    merged.extend(_with_newline(chunk) for index, (_, chunk) in enumerate(revised_sections) if index not in used)
+    return ''.join(merged).rstrip('\n') + '\n'
+
+
+def _under_heading(chunk: str, replacement: str, has_heading: bool) -> str:
+    '''The body of replacement (without its own heading line) under chunk's heading line.'''
+    heading = chunk.partition('\n')[0]
+    body = replacement.partition('\n')[2] if has_heading else replacement
+    return f"{heading}\n{body.lstrip(chr(10))}"
+
+
+def _with_newline(chunk: str) -> str:
+    return chunk if chunk.endswith('\n') else chunk + '\n'
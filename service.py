@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from aiohttp import web
+from pydantic import BaseModel, Field, ValidationError
+
+from brief import Brief
+from checkpoints import open_checkpointer, run_config
+from graph import SAVE_FILE_NODE, answer_requirements, build_graph, pending_question, stream_run
+from instrumentation import get_instrumentation, instrumented_config
+from tools.web import close_web_clients
+
+# Local HTTP job API around the compiled graph. Runs execute on a bounded
+# worker pool; requirement questions pause the run (interrupt before the
+# input node) instead of blocking on input().
+WORKERS = 4
+MAX_QUEUED = 32
+MAX_FINISHED_JOBS = 1000
+# seconds a question may go unanswered before its job expires (and can be pruned)
+WAITING_TIMEOUT = 60 * 60
+EXPIRY_INTERVAL = 60
+SSE_HEARTBEAT = 15
+RETRY_AFTER = 5
+
+QUEUED = 'queued'
+RUNNING = 'running'
+WAITING = 'waiting_for_input'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED = {SUCCEEDED, FAILED}
+
+
+class JobRequest(Brief):
+    website_links: list[str] = Field(min_length=1, description='Brand website URLs to research.')
+    requirements: str | None = Field(default=None, description='Brand details; omit to be interviewed.')
+    # typed brand_name, budget and goals (see Brief) may be given instead; a complete set skips the interview
+
+
+class AnswerRequest(BaseModel):
+    answer: str = Field(min_length=1)
+
+
+class QueueFull(Exception):
+    '''Raised when the work queue is at MAX_QUEUED; mapped to 503.'''
+
+
+class InvalidJobState(Exception):
+    '''Raised when a job cannot take the requested action; mapped to 409.'''
+
+
+@dataclass
+class Job:
+    id: str
+    request: JobRequest
+    status: str = QUEUED
+    question: str | None = None
+    result: str | None = None  # save node message, naming the output file
+    report: str | None = None  # formatted markdown report
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    events: list[dict] = field(default_factory=list)
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'question': self.question,
+            'result': self.result,
+            'report': self.report,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+    async def publish(self, event: str, data: dict, status: str | None = None):
+        async with self.changed:
+            if status is not None:
+                self.status = status
+            self.updated_at = time.time()
+            self.events.append({'event': event, 'data': data})
+            self.changed.notify_all()
+
+
+def _jsonable(value):
+    # messages become their text; everything else falls back to str
+    return value.content if hasattr(value, 'content') else str(value)
+
+
+class JobManager:
+    '''Bounded queue feeding a fixed pool of graph workers.
+
+    A job occupies a worker only while the graph runs; while it waits for a
+    requirements answer it holds no worker. Jobs left waiting longer than
+    waiting_timeout fail as expired. Submissions and answers are rejected
+    with QueueFull when MAX_QUEUED steps are already waiting.
+    '''
+
+    def __init__(self, graph, workers: int = WORKERS, max_queued: int = MAX_QUEUED,
+                 waiting_timeout: float = WAITING_TIMEOUT):
+        self.graph = graph
+        self.workers = workers
+        self.waiting_timeout = waiting_timeout
+        self.jobs: dict[str, Job] = {}
+        self.busy = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._expire_periodically()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _config(self, job: Job) -> dict:
+        return run_config(job.id, instrumented_config(job.id, {'run_name': f'job-{job.id}'}))
+
+    def _enqueue(self, job: Job, answer: str | None = None):
+        try:
+            self._queue.put_nowait((job, answer))
+        except asyncio.QueueFull:
+            raise QueueFull(f'{self._queue.qsize()} steps already queued') from None
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.status in FINISHED]
+        for job in sorted(finished, key=lambda job: job.updated_at)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
+
+    async def expire_waiting(self):
+        '''Fails jobs whose question has gone unanswered for waiting_timeout (an abandoned interview).'''
+        now = time.time()
+        for job in list(self.jobs.values()):
+            if job.status == WAITING and now - job.updated_at > self.waiting_timeout:
+                job.question = None
+                job.error = f'expired: no answer within {self.waiting_timeout:g}s'
+                await job.publish('error', {'error': job.error}, status=FAILED)
+        self._prune()
+
+    async def _expire_periodically(self):
+        while True:
+            await asyncio.sleep(min(EXPIRY_INTERVAL, self.waiting_timeout))
+            await self.expire_waiting()
+
+    def submit(self, request: JobRequest) -> Job:
+        job = Job(id=str(uuid.uuid4()), request=request)
+        self._enqueue(job)
+        self.jobs[job.id] = job
+        self._prune()
+        return job
+
+    async def answer(self, job: Job, answer: str):
+        if job.status != WAITING:
+            raise InvalidJobState(f'job is {job.status}, not waiting for input')
+        self._enqueue(job, answer)
+        job.question = None
+        await job.publish('status', {'status': QUEUED}, status=QUEUED)
+
+    async def _worker(self):
+        while True:
+            job, answer = await self._queue.get()
+            self.busy += 1
+            try:
+                await self._advance(job, answer)
+            finally:
+                self.busy -= 1
+                self._queue.task_done()
+
+    async def _advance(self, job: Job, answer: str | None):
+        '''Runs the job's graph until it finishes or pauses for a question.'''
+        config = self._config(job)
+        await job.publish('status', {'status': RUNNING}, status=RUNNING)
+        try:
+            if answer is not None:
+                await answer_requirements(self.graph, config, answer)
+            async for output in stream_run(self.graph, job.request.model_dump(), config):
+                for node, update in output.items():
+                    # the formatter's report, or the quality check's when it was formatted speculatively
+                    if node != SAVE_FILE_NODE and update.get('final_output'):
+                        job.report = update['final_output']
+                    await job.publish('node', {'node': node, 'update': json.loads(json.dumps(update, default=_jsonable))})
+            question = await pending_question(self.graph, config)
+            if question is not None:
+                job.question = question
+                await job.publish('question', {'question': question}, status=WAITING)
+                return
+            job.result = (await self.graph.aget_state(config)).values.get('final_output')
+            await job.publish('done', {'result': job.result, 'report': job.report}, status=SUCCEEDED)
+        except Exception as error:
+            job.error = f'{type(error).__name__}: {error}'
+            await job.publish('error', {'error': job.error}, status=FAILED)
+
+    def stats(self) -> dict:
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {'workers': self.workers, 'busy': self.busy, 'queued': self._queue.qsize(), 'jobs': counts}
+
+
+# HTTP handlers
+def _manager(request: web.Request) -> JobManager:
+    return request.app['manager']
+
+
+def _job(request: web.Request) -> Job:
+    job = _manager(request).jobs.get(request.match_info['job_id'])
+    if job is None:
+        raise web.HTTPNotFound(text=json.dumps({'error': 'unknown job'}), content_type='application/json')
+    return job
+
+
+async def _parse(request: web.Request, model):
+    try:
+        return model(**await request.json())
+    except (ValueError, ValidationError) as error:
+        raise web.HTTPBadRequest(text=json.dumps({'error': str(error)}), content_type='application/json')
+
+
+def _busy_response(error: QueueFull) -> web.Response:
+    return web.json_response({'error': f'busy: {error}'}, status=503, headers={'Retry-After': str(RETRY_AFTER)})
+
+
+async def submit_job(request: web.Request) -> web.Response:
+    job_request = await _parse(request, JobRequest)
+    try:
+        job = _manager(request).submit(job_request)
+    except QueueFull as error:
+        return _busy_response(error)
+    return web.json_response(job.as_dict(), status=202, headers={'Location': f'/jobs/{job.id}'})
+
+
+async def get_job(request: web.Request) -> web.Response:
+    return web.json_response(_job(request).as_dict())
+
+
+async def answer_job(request: web.Request) -> web.Response:
+    job = _job(request)
+    answer = await _parse(request, AnswerRequest)
+    try:
+        await _manager(request).answer(job, answer.answer)
+    except QueueFull as error:
+        return _busy_response(error)
+    except InvalidJobState as error:
+        return web.json_response({'error': str(error)}, status=409)
+    return web.json_response(job.as_dict(), status=202)
+
+
+async def job_events(request: web.Request) -> web.StreamResponse:
+    '''Server-sent events: every status change, node update, question and the result.
+
+    Reconnecting clients resume after the Last-Event-ID they saw. The stream
+    ends once the job has succeeded or failed.
+    '''
+    job = _job(request)
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+    await response.prepare(request)
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    index = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+    while True:
+        async with job.changed:
+            if index >= len(job.events) and job.status not in FINISHED:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(job.changed.wait(), SSE_HEARTBEAT)
+            events = job.events[index:]
+            finished = job.status in FINISHED
+        if not events and not finished:
+            await response.write(b': keep-alive\n\n')
+        for event in events:
+            payload = json.dumps(event['data'])
+            await response.write(f"id: {index}\nevent: {event['event']}\ndata: {payload}\n\n".encode('utf-8'))
+            index += 1
+        if finished and index >= len(job.events):
+            break
+    await response.write_eof()
+    return response
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response(_manager(request).stats())
+
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(text=get_instrumentation().prometheus.render(), content_type='text/plain')
+
+
+def create_app(graph=None, workers: int = WORKERS, max_queued: int = MAX_QUEUED, graph_options: dict | None = None,
+               waiting_timeout: float = WAITING_TIMEOUT):
+    '''aiohttp app; without a graph, one is built on a SQLite checkpointer at startup.'''
+    app = web.Application()
+
+    async def lifecycle(app: web.Application):
+        async with contextlib.AsyncExitStack() as stack:
+            service_graph = graph
+            if service_graph is None:
+                service_graph = build_graph(
+                    checkpointer=await stack.enter_async_context(open_checkpointer()),
+                    interrupt_before_input=True,
+                    **(graph_options or {}),
+                )
+            manager = JobManager(service_graph, workers, max_queued, waiting_timeout)
+            manager.start()
+            app['manager'] = manager
+            yield
+            await manager.stop()
+            await close_web_clients()
+
+    app.cleanup_ctx.append(lifecycle)
+    app.router.add_post('/jobs', submit_job)
+    app.router.add_get('/jobs/{job_id}', get_job)
+    app.router.add_post('/jobs/{job_id}/answer', answer_job)
+    app.router.add_get('/jobs/{job_id}/events', job_events)
+    app.router.add_get('/health', health)
+    app.router.add_get('/metrics', metrics)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve marketing report jobs over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Graph runs executing at once.')
+    parser.add_argument('--max-queued', type=int, default=MAX_QUEUED, help='Queued steps before answering 503.')
+    parser.add_argument('--waiting-timeout', type=float, default=WAITING_TIMEOUT,
+                        help='Seconds a question may go unanswered before its job expires.')
+    parser.add_argument('--fan-out', action='store_true', help='Generate strategies per marketing goal in parallel.')
+    parser.add_argument('--speculative-format', action='store_true', help='Format reports while they are quality checked.')
+    args = parser.parse_args()
+    web.run_app(
+        create_app(workers=args.workers, max_queued=args.max_queued, graph_options={
+            'fan_out': args.fan_out, 'speculative_format': args.speculative_format,
+        }, waiting_timeout=args.waiting_timeout),
+        host=args.host, port=args.port,
+    )
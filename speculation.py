@@ -0,0 +1,85 @@
+import asyncio
+import contextlib
+import threading
+import time
+from dataclasses import dataclass
+
+# Work started before it is known to be needed (the formatter runs alongside
+# the quality check that decides whether the report is finished).
+
+
+@dataclass
+class SpeculationStats:
+    hits: int = 0
+    misses: int = 0
+    seconds_saved: float = 0.0  # speculative work that overlapped the decision and was used
+    seconds_wasted: float = 0.0  # speculative work that was thrown away
+
+
+class SpeculationTotals:
+    '''Speculation outcomes accumulated over every run in this process.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = SpeculationStats()
+
+    def record(self, hit: bool, seconds: float):
+        with self._lock:
+            if hit:
+                self.stats.hits += 1
+                self.stats.seconds_saved += seconds
+            else:
+                self.stats.misses += 1
+                self.stats.seconds_wasted += seconds
+
+    def summary(self) -> dict:
+        with self._lock:
+            total = self.stats.hits + self.stats.misses
+            return {
+                'hits': self.stats.hits,
+                'misses': self.stats.misses,
+                'hit_rate': self.stats.hits / total if total else 0.0,
+                'seconds_saved': self.stats.seconds_saved,
+                'seconds_wasted': self.stats.seconds_wasted,
+            }
+
+
+speculation_totals = SpeculationTotals()
+
+
+class Speculation:
+    '''A task started before its result is known to be needed.
+
+    commit() waits for and returns the result; discard() cancels the task.
+    Either records the outcome in speculation_totals exactly once.
+    '''
+
+    def __init__(self, coro, totals: SpeculationTotals = speculation_totals):
+        self.totals = totals
+        self.started = time.perf_counter()
+        self.finished = None
+        self.task = asyncio.create_task(coro)
+        self.task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        self.finished = time.perf_counter()
+
+    def _elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    async def commit(self):
+        # the part of the work that ran while the decision was being made
+        overlap = self._elapsed()
+        try:
+            result = await self.task
+        except BaseException:
+            self.totals.record(False, self._elapsed())
+            raise
+        self.totals.record(True, overlap)
+        return result
+
+    async def discard(self):
+        self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await self.task
+        self.totals.record(False, self._elapsed())
@@ -1,19 +1,74 @@
 from typing import Annotated, Sequence, TypedDict
 from langchain_core.messages import BaseMessage
-import operator
+
+from tokens import estimate_tokens, truncate_to_tokens
+
+
+def bounded_messages(max_items: int | None = None, max_tokens: int | None = None, replace_by_name: bool = False,
+                     pinned_names: tuple[str, ...] = ()):
+    '''Reducer that appends messages but keeps the channel bounded.
+
+    replace_by_name: a new message replaces earlier ones from the same node
+    (e.g. a consultant revision supersedes the previous draft).
+    max_items / max_tokens: oldest entries are dropped beyond the window;
+    the newest message is always kept, truncated if it alone exceeds max_tokens.
+    pinned_names: messages from these names are never dropped (e.g. the user's answers).
+    '''
+    def reducer(left: Sequence[BaseMessage] | None, right: Sequence[BaseMessage] | BaseMessage | None) -> list[BaseMessage]:
+        merged = list(left or [])
+        if right is None:
+            right = []
+        elif isinstance(right, BaseMessage):
+            right = [right]
+        for message in right:
+            if replace_by_name and message.name:
+                merged = [m for m in merged if m.name != message.name]
+            merged.append(message)
+
+        def oldest_droppable() -> int | None:
+            return next((i for i, m in enumerate(merged[:-1]) if m.name not in pinned_names), None)
+
+        if max_items is not None:
+            while len(merged) > max_items and (index := oldest_droppable()) is not None:
+                merged.pop(index)
+        if max_tokens is not None and merged:
+            total = sum(estimate_tokens(str(m.content)) for m in merged)
+            while total > max_tokens and (index := oldest_droppable()) is not None:
+                total -= estimate_tokens(str(merged.pop(index).content))
+            newest = merged[-1]
+            if total > max_tokens and isinstance(newest.content, str):
+                budget = max_tokens - (total - estimate_tokens(newest.content))
+                merged[-1] = newest.copy(update={'content': truncate_to_tokens(newest.content, budget)})
+        return merged
+
+    return reducer
+
+
+# node that adds the user's answers to message_requirements (see graph.input_node)
+INPUT_NAME = 'inputer'
+
+
+def merge_goal_outputs(left: dict | None, right: dict | None) -> dict:
+    '''Per-goal outputs from parallel workers; a goal's newer output replaces its older one.'''
+    return {**(left or {}), **(right or {})}
+
 
 class AgentState(TypedDict):
-    message_requirements: Annotated[list[BaseMessage], operator.add]
+    # the user's answers hold the brief, so only old questions are dropped
+    message_requirements: Annotated[list[BaseMessage], bounded_messages(max_items=20, pinned_names=(INPUT_NAME,))]
     next_requirements: str
     input_data: str
 
     website_links: list[str]
     requirements_completed: bool  # Fixed typo here
+    brief: dict  # brief.Brief fields typed in by the caller
+    scrape_id: str  # key of the background website scrape (see graph.start_website_data)
 
-    website_data: Annotated[Sequence[BaseMessage], operator.add]
-    brand_tuner: Annotated[Sequence[BaseMessage], operator.add]
-    consultant: Annotated[Sequence[BaseMessage], operator.add]
-    quality_checker: Annotated[Sequence[BaseMessage], operator.add]
+    # Only the latest output of each agent is ever read, so superseded ones are replaced
+    website_data: Annotated[Sequence[BaseMessage], bounded_messages(max_tokens=6000, replace_by_name=True)]
+    brand_tuner: Annotated[Sequence[BaseMessage], bounded_messages(replace_by_name=True)]
+    consultant: Annotated[Sequence[BaseMessage], bounded_messages(replace_by_name=True)]
+    quality_checker: Annotated[Sequence[BaseMessage], bounded_messages(max_items=3)]
 
     last_brand_tuner: str
     last_consultant: str
@@ -22,4 +77,14 @@ class AgentState(TypedDict):
     OPTIONS: list[str]
     MEMBERS: list[str]
     final_output: str
-    next: str
\ No newline at end of file
+    output_file: str  # report file the formatter streams into
+    next: str
+
+    # targeted revisions in the quality-check loop
+    failed_sections: list[str]
+    revision: int
+    reviewed_digest: str
+
+    # per-goal fan-out: goal -> {'consultant': ..., 'brand_tuner': ...}
+    goals: list[str]
+    goal_outputs: Annotated[dict, merge_goal_outputs]
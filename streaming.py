@@ -0,0 +1,126 @@
+import asyncio
+from typing import Any, Callable
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.runnables import RunnableConfig, ensure_config
+from langchain_core.tracers._streaming import _StreamingCallbackHandler
+
+# Token streaming for the graph. The pinned langgraph has no "messages"
+# stream mode, so TokenStream provides it: (message chunk, metadata) pairs for
+# every model call that streams. Calls only stream under a StreamTokens
+# handler, which the formatter (and, optionally, the agents) add to their calls.
+
+
+class StreamTokens(AsyncCallbackHandler, _StreamingCallbackHandler):
+    '''Makes model calls under it stream (see models.RoutedChatModel), passing each token to sink.'''
+
+    def __init__(self, sink: Callable[[str], Any] | None = None):
+        self.sink = sink
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any):
+        if self.sink is not None and token:
+            self.sink(token)
+
+    # langchain taps streamed runnable output through streaming handlers; nothing to add here
+    def tap_output_aiter(self, run_id, output):
+        return output
+
+    def tap_output_iter(self, run_id, output):
+        return output
+
+
+def streaming_config(config: RunnableConfig | None = None, sink: Callable[[str], Any] | None = None) -> RunnableConfig:
+    '''config (by default the current node's) with a StreamTokens handler added.
+
+    The handler is added in place: merge_configs would fill the added part from
+    the current node's config, overriding metadata the caller changed.
+    '''
+    config = ensure_config(config)
+    handler = StreamTokens(sink)
+    callbacks = config.get('callbacks')
+    if callbacks is None:
+        callbacks = [handler]
+    elif isinstance(callbacks, list):
+        callbacks = [*callbacks, handler]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    return {**config, 'callbacks': callbacks}
+
+
+class FileSink:
+    '''A StreamTokens sink that appends tokens to an open file.
+
+    Tokens are buffered and written, then flushed, in batches from a worker
+    thread, so the event loop never waits on the disk. close() writes what is
+    left; tokens holds everything written.
+    '''
+
+    def __init__(self, file):
+        self.file = file
+        self.tokens: list[str] = []
+        self._pending: list[str] = []
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._writer = asyncio.create_task(self._drain())
+
+    def write(self, token: str):
+        self.tokens.append(token)
+        self._pending.append(token)
+        self._wake.set()
+
+    def _write(self, text: str):
+        self.file.write(text)
+        self.file.flush()
+
+    async def _drain(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            batch, self._pending = self._pending, []
+            if batch:
+                await asyncio.to_thread(self._write, ''.join(batch))
+            if self._closing and not self._pending:
+                return
+
+    async def close(self):
+        self._closing = True
+        self._wake.set()
+        await self._writer
+
+    def cancel(self):
+        self._writer.cancel()
+
+
+class Streamed:
+    '''Wraps a runnable (e.g. an agent) so every call of it streams its tokens.'''
+
+    def __init__(self, runnable):
+        self.runnable = runnable
+
+    async def ainvoke(self, input, config: RunnableConfig | None = None, **kwargs: Any):
+        return await self.runnable.ainvoke(input, streaming_config(config), **kwargs)
+
+
+class TokenStream(AsyncCallbackHandler):
+    '''Collects streamed tokens of a run as ('messages', (chunk, metadata)) items on queue.
+
+    metadata is the model call's, so langgraph_node names the node that made it.
+    '''
+
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+        self._metadata: dict = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs: Any):
+        self._metadata[run_id] = metadata or {}
+
+    async def on_llm_new_token(self, token: str, *, chunk=None, run_id, **kwargs: Any):
+        if chunk is not None and run_id in self._metadata:
+            self.queue.put_nowait(('messages', (chunk.message, self._metadata[run_id])))
+
+    async def on_llm_end(self, response, *, run_id, **kwargs: Any):
+        self._metadata.pop(run_id, None)
+
+    async def on_llm_error(self, error, *, run_id, **kwargs: Any):
+        self._metadata.pop(run_id, None)
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from brief import Brief, extract_brand_name, extract_brief, extract_budget
+from graph import INPUT_NAME, collect_brief, requirements_node, summary
+
+
+def test_digits_are_not_a_brand_name():
+    text = 'We are 3 friends running a tshirt shop, budget $5k per month, want more sales'
+    brief = extract_brief(text)
+    assert brief.brand_name is None
+    assert brief.budget == '$5k per month'
+    assert not brief.complete
+
+
+def test_article_is_not_a_brand_name():
+    text = 'I run A small bakery in Pune with a 20k budget and want more reach'
+    brief = extract_brief(text)
+    assert brief.brand_name is None
+    assert brief.budget == '20k'
+    assert not brief.complete
+
+
+def test_unlabelled_names_are_not_extracted():
+    assert extract_brand_name('Acme, a fan apparel label') is None
+    assert extract_brand_name('our brand Acme sells shoes') is None
+
+
+def test_labelled_name_skips_rejected_candidates():
+    assert extract_brand_name('Brand: The') is None
+    assert extract_brand_name('company name is 42') is None
+    assert extract_brand_name('Brand name is A. The brand is called Acme Co') == 'Acme Co'
+
+
+def test_unlabelled_amount_is_not_a_budget():
+    assert extract_budget('We sold $5k of shirts last month') is None
+    assert extract_budget('Our budget is small. We sold $5k of shirts last month') is None
+
+
+def test_labelled_brief_is_complete():
+    brief = extract_brief('Brand name: Acme Co. Budget Rs 5 lakh per month. Goals: brand awareness')
+    assert brief == Brief(brand_name='Acme Co', budget='Rs 5 lakh per month', goals=['Brand Awareness'])
+
+
+class FailingChain:
+    async def ainvoke(self, state):
+        raise AssertionError('the chain should not be called')
+
+
+def test_labelled_answer_skips_the_interview_and_summary_llm():
+    answer = HumanMessage(content='Brand name: Acme Co, budget is Rs 5 lakh, goal: sales', name=INPUT_NAME)
+    state = {'brief': {}, 'message_requirements': [answer]}
+    assert collect_brief(state).complete
+    update = asyncio.run(requirements_node(state, FailingChain()))
+    assert update['next_requirements'] == 'SUMMARY'
+    update = asyncio.run(summary(state, FailingChain()))
+    assert update['input_data'].startswith('Brand name: Acme Co\nBudget: Rs 5 lakh\nMarketing goals: Sales Growth')
+
+
+def test_unlabelled_answer_goes_to_the_llm():
+    answer = HumanMessage(content='We are 3 friends running a tshirt shop, budget $5k per month, want more sales', name=INPUT_NAME)
+    state = {'brief': {}, 'message_requirements': [answer]}
+    with pytest.raises(AssertionError, match='should not be called'):
+        asyncio.run(requirements_node(state, FailingChain()))
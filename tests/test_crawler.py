@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from tools.crawler import crawl_site
+from tools.http_client import close_http_client
+from tools.page_cache import PageCache, set_page_cache
+
+PAGES = {
+    '/': '<html><body><a href="/about">About</a><a href="/missing">Our story</a></body></html>',
+    '/about': '<html><body><p>About the brand</p></body></html>',
+    '/private/': '<html><body><a href="/about">About</a></body></html>',
+}
+
+
+async def handle(request: web.Request) -> web.Response:
+    if request.path == '/robots.txt':
+        return web.Response(text='User-agent: *\nDisallow: /private/\n')
+    if request.path in PAGES:
+        return web.Response(text=PAGES[request.path], content_type='text/html')
+    return web.Response(status=404, text='<html><body>Not found</body></html>', content_type='text/html')
+
+
+@pytest.fixture
+def page_cache(tmp_path):
+    set_page_cache(PageCache(str(tmp_path / 'pages.sqlite')))
+    yield
+    set_page_cache(None)
+
+
+def crawl(path: str) -> list[str]:
+    async def run():
+        app = web.Application()
+        app.router.add_route('GET', '/{tail:.*}', handle)
+        async with TestServer(app) as server:
+            try:
+                pages = await crawl_site(str(server.make_url(path)))
+            finally:
+                await close_http_client()
+            return [page.url.replace(str(server.make_url('')), '') for page in pages]
+
+    return asyncio.run(run())
+
+
+def test_error_pages_are_not_crawled(page_cache):
+    assert crawl('/') == ['/', '/about']
+
+
+def test_seed_disallowed_by_robots_is_not_fetched(page_cache):
+    assert crawl('/private/') == []
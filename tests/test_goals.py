@@ -0,0 +1,30 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+from goals import MAX_GOALS, extract_goals
+from graph import INPUT_NAME, goal_planner_node
+
+
+def test_generic_words_need_a_goal_label():
+    summary = 'The brand wants to reach new customers, grow revenue and build a community around its product launch.'
+    assert extract_goals(summary) == ['Product Launch Success']
+
+
+def test_labelled_goal_words():
+    assert extract_goals('Goals: sales, reach and SEO. Our reviews are good.') == [
+        'Sales Growth', 'Brand Awareness', 'Search Engine Rankings',
+    ]
+
+
+def test_goal_phrases_in_order_of_mention():
+    assert extract_goals('We want more sales and brand awareness') == ['Sales Growth', 'Brand Awareness']
+
+
+def test_planner_prefers_typed_goals_and_caps_them():
+    answer = HumanMessage(content='Goals: sales, reach, seo, traffic, retention, reviews', name=INPUT_NAME)
+    state = {'brief': {}, 'message_requirements': [answer], 'input_data': 'Goals: community engagement'}
+    goals = asyncio.run(goal_planner_node(state))['goals']
+    assert goals == ['Sales Growth', 'Brand Awareness', 'Search Engine Rankings', 'Website Traffic'][:MAX_GOALS]
+    state['brief'] = {'goals': ['Engagement']}
+    assert asyncio.run(goal_planner_node(state))['goals'] == ['Engagement']
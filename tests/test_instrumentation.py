@@ -0,0 +1,13 @@
+import json
+
+from instrumentation import JsonlExporter
+
+
+def test_jsonl_exporter_writes_every_event(tmp_path):
+    path = tmp_path / 'metrics' / 'events.jsonl'
+    exporter = JsonlExporter(str(path))
+    for i in range(500):
+        exporter.export({'type': 'llm', 'index': i})
+    exporter.flush()
+    lines = path.read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['index'] for line in lines] == list(range(500))
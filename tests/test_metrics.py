@@ -0,0 +1,15 @@
+from tools.metrics import FetchMetrics
+
+
+def test_totals_cover_every_fetch_and_records_are_bounded():
+    metrics = FetchMetrics(max_records=3)
+    for i in range(10):
+        metrics.record(f'https://example.com/{i}', 'network', 200, fetch_time=1.0, parse_time=0.5)
+    metrics.record('https://example.com/0', 'cache')
+    summary = metrics.summary()
+    assert len(metrics.records) == 3
+    assert summary['urls'] == 11
+    assert summary['network'] == 10
+    assert summary['cached'] == 1
+    assert summary['fetch_time_total'] == 10.0
+    assert summary['parse_time_median'] == 0.5
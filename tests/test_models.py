@@ -0,0 +1,66 @@
+import asyncio
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from models import HEDGE_AFTER, MIN_HEDGE_AFTER, MIN_LATENCY_SAMPLES, ProviderHealth, RoutedChatModel
+
+
+class SleepyModel(BaseChatModel):
+    delay: float = 0.0
+    text: str = ''
+
+    @property
+    def _llm_type(self):
+        return 'sleepy'
+
+    def _generate(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.text))])
+
+
+def test_hedge_delay_follows_observed_latency():
+    health = ProviderHealth()
+    assert health.hedge_delay('p:a', HEDGE_AFTER) == HEDGE_AFTER
+    for second in range(1, 21):
+        health.record_success('p:a', float(second))
+    assert health.hedge_delay('p:a', HEDGE_AFTER) == 20.0
+    for _ in range(100):
+        health.record_success('p:b', 0.01)
+    assert health.hedge_delay('p:b', HEDGE_AFTER) == MIN_HEDGE_AFTER
+
+
+def test_slow_route_is_demoted():
+    health = ProviderHealth()
+    health.record_success('p:a', 20.0)
+    health.record_success('q:b', 1.0)
+    assert health.order(['p:a', 'q:b']) == ['q:b', 'p:a']
+    # still demoted after its latency is reset for a fresh measurement
+    assert health.order(['p:a', 'q:b']) == ['q:b', 'p:a']
+    assert ProviderHealth().order(['p:a', 'q:b']) == ['p:a', 'q:b']
+
+
+def test_usual_long_generations_are_not_hedged():
+    health = ProviderHealth()
+    for _ in range(MIN_LATENCY_SAMPLES):
+        health.record_success('p:a', 1.5)
+    model = RoutedChatModel(
+        routes=[SleepyModel(delay=0.2, text='A'), SleepyModel(text='B')],
+        route_names=['p:a', 'q:b'], hedge_after=0.05, health=health,
+    )
+    assert asyncio.run(model.ainvoke([HumanMessage(content='x')])).content == 'A'
+    assert health.snapshot().get('q:b', {}).get('hedges', 0) == 0
+
+
+def test_route_that_loses_races_is_demoted():
+    health = ProviderHealth()
+    model = RoutedChatModel(
+        routes=[SleepyModel(delay=0.5, text='A'), SleepyModel(text='B')],
+        route_names=['p:a', 'q:b'], hedge_after=0.05, health=health,
+    )
+    assert asyncio.run(model.ainvoke([HumanMessage(content='x')])).content == 'B'
+    assert health.order(['p:a', 'q:b']) == ['q:b', 'p:a']
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import pytest
+import requests
+from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+from rate_limit import Budget, RateLimiter, is_rate_limited, set_rate_limiter
+from tools.search import SEARCH_ROUTE, RateLimitedTavilySearch
+
+
+def http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    response.reason = 'Too Many Requests' if status == 429 else 'Server Error'
+    response.url = 'https://api.tavily.com/search'
+    try:
+        response.raise_for_status()
+    except requests.HTTPError as error:
+        return error
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setenv('TAVILY_API_KEY', 'x')
+    limiter = RateLimiter({SEARCH_ROUTE: Budget(rpm=600)})
+    set_rate_limiter(limiter)
+    yield limiter.route(SEARCH_ROUTE)
+    set_rate_limiter(None)
+
+
+def test_http_error_429_is_rate_limited():
+    assert is_rate_limited(http_error(429))
+    assert is_rate_limited(Exception(repr(http_error(429))))
+    assert not is_rate_limited(http_error(500))
+    assert not is_rate_limited(Exception('found 429 results'))
+
+
+def test_sync_429_penalizes_the_search_route(limiter, monkeypatch):
+    def raw_results(self, *args, **kwargs):
+        raise http_error(429)
+
+    monkeypatch.setattr(TavilySearchAPIWrapper, 'raw_results', raw_results)
+    RateLimitedTavilySearch(max_results=1)._run('query')
+    assert limiter.blocked_until > time.monotonic()
+
+
+def test_async_429_penalizes_the_search_route(limiter, monkeypatch):
+    async def raw_results_async(self, *args, **kwargs):
+        raise Exception('Error 429: Too Many Requests')
+
+    monkeypatch.setattr(TavilySearchAPIWrapper, 'raw_results_async', raw_results_async)
+    asyncio.run(RateLimitedTavilySearch(max_results=1)._arun('query'))
+    assert limiter.blocked_until > time.monotonic()
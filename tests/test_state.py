@@ -0,0 +1,15 @@
+import typing
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from state import INPUT_NAME, AgentState
+
+
+def test_message_requirements_keep_every_answer():
+    reducer = typing.get_type_hints(AgentState, include_extras=True)['message_requirements'].__metadata__[0]
+    messages = []
+    for i in range(30):
+        messages = reducer(messages, [AIMessage(content=f'question {i}', name='requirements')])
+        messages = reducer(messages, [HumanMessage(content=f'answer {i}', name=INPUT_NAME)])
+    answers = [m.content for m in messages if m.name == INPUT_NAME]
+    assert answers == [f'answer {i}' for i in range(30)]
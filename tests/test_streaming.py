@@ -0,0 +1,20 @@
+import asyncio
+
+from streaming import FileSink
+
+
+def test_file_sink_writes_every_token(tmp_path):
+    path = tmp_path / 'report.md'
+
+    async def stream():
+        with open(path, 'w', encoding='utf-8') as file:
+            sink = FileSink(file)
+            for i in range(100):
+                sink.write(f'{i} ')
+                if i % 10 == 0:
+                    await asyncio.sleep(0)
+            await sink.close()
+            return sink.tokens
+
+    tokens = asyncio.run(stream())
+    assert path.read_text(encoding='utf-8') == ''.join(tokens) == ''.join(f'{i} ' for i in range(100))
@@ -0,0 +1,13 @@
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    '''Cheap provider-agnostic token estimate (~4 characters per token).'''
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = '\n[truncated]') -> str:
+    '''text cut to about max_tokens (marker included) when it is longer.'''
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max(max_tokens * CHARS_PER_TOKEN - len(marker), 0)] + marker
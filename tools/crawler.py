@@ -0,0 +1,190 @@
+import asyncio
+import re
+import time
+import xml.etree.ElementTree as ElementTree
+from dataclasses import dataclass
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+from tools.http_client import DEFAULT_HEADERS, get_http_client
+from tools.page_cache import normalize_url, site_key
+from tools.parsing import get_parser_pool
+from tools.web import PageStatusError, UnsupportedContentError, fetch_page
+
+# Bounded same-site crawl used by the research tool's crawl mode.
+CRAWL_MAX_PAGES = 10
+CRAWL_MAX_DEPTH = 2
+CRAWL_CONCURRENCY = 6
+CRAWL_PAGE_CHARS = 2000  # deduplicated text kept per crawled page; seeds keep their full text
+SITEMAP_MAX_URLS = 500
+SITEMAP_MAX_FILES = 5
+ROBOTS_MAX_BYTES = 512 * 1024
+SITEMAP_MAX_BYTES = 5 * 1024 * 1024
+USER_AGENT = DEFAULT_HEADERS['User-Agent']
+
+# path/anchor keywords -> weight; pages most likely to describe the brand rank first
+USEFUL_KEYWORDS = {
+    'about': 5, 'story': 4, 'brand': 3, 'mission': 3, 'values': 3, 'collections': 3,
+    'collection': 3, 'products': 2, 'product': 2, 'shop': 2, 'arrivals': 2, 'bestsellers': 2,
+    'sustainability': 2, 'category': 1, 'catalog': 1, 'faq': 1, 'press': 1, 'blog': 1,
+}
+USELESS_KEYWORDS = {
+    'login', 'signin', 'logout', 'register', 'account', 'cart', 'checkout', 'wishlist',
+    'search', 'privacy', 'terms', 'policy', 'policies', 'cookie', 'cookies', 'returns',
+}
+SKIPPED_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.pdf', '.zip', '.mp4',
+    '.mp3', '.css', '.js', '.json', '.xml', '.gz', '.woff', '.woff2',
+)
+SITEMAP_NAMESPACE = re.compile(r'^\{[^}]*\}')
+
+
+@dataclass
+class CrawledPage:
+    url: str
+    depth: int
+    score: float
+    text: str
+
+
+def score_url(url: str, anchor: str = '') -> float:
+    '''Higher for pages likely to describe the brand, its products and collections.'''
+    path = urlsplit(url).path.lower()
+    words = set(re.split(r'[^a-z0-9]+', f'{path} {anchor.lower()}'))
+    if words & USELESS_KEYWORDS:
+        return -1.0
+    score = float(sum(USEFUL_KEYWORDS.get(word, 0) for word in words))
+    # shallow paths are overview pages; deep ones are usually single items
+    return score - 0.5 * path.strip('/').count('/')
+
+
+def is_crawlable(url: str, site: str) -> bool:
+    parts = urlsplit(url)
+    return (
+        parts.scheme in ('http', 'https')
+        and site_key(url) == site
+        and not parts.path.lower().endswith(SKIPPED_EXTENSIONS)
+    )
+
+
+async def _read_body(url: str, max_bytes: int) -> tuple[int, str]:
+    async with get_http_client().get(url) as response:
+        body = await response.content.read(max_bytes)
+        return response.status, body.decode(response.charset or 'utf-8', errors='replace')
+
+
+async def load_robots(seed: str) -> RobotFileParser:
+    '''robots.txt of the seed's origin; unreachable files allow everything.'''
+    parts = urlsplit(seed)
+    robots = RobotFileParser(f'{parts.scheme}://{parts.netloc}/robots.txt')
+    try:
+        status, body = await _read_body(robots.url, ROBOTS_MAX_BYTES)
+    except Exception:
+        status, body = 0, ''
+    if status in (401, 403):
+        robots.disallow_all = True
+    elif status == 200:
+        robots.parse(body.splitlines())
+    else:
+        robots.allow_all = True
+    return robots
+
+
+async def read_sitemaps(seed: str, robots: RobotFileParser) -> list[str]:
+    '''Page URLs listed in the site's sitemaps (robots.txt Sitemap: lines, else /sitemap.xml).'''
+    parts = urlsplit(seed)
+    pending = list(robots.site_maps() or [f'{parts.scheme}://{parts.netloc}/sitemap.xml'])
+    urls = []
+    files = 0
+    while pending and files < SITEMAP_MAX_FILES and len(urls) < SITEMAP_MAX_URLS:
+        sitemap_url = pending.pop(0)
+        files += 1
+        try:
+            status, body = await _read_body(sitemap_url, SITEMAP_MAX_BYTES)
+            root = ElementTree.fromstring(body) if status == 200 else None
+        except Exception:
+            continue
+        if root is None:
+            continue
+        is_index = SITEMAP_NAMESPACE.sub('', root.tag) == 'sitemapindex'
+        for element in root.iter():
+            if SITEMAP_NAMESPACE.sub('', element.tag) == 'loc' and element.text:
+                (pending if is_index else urls).append(urljoin(sitemap_url, element.text.strip()))
+    return urls[:SITEMAP_MAX_URLS]
+
+
+async def crawl_site(
+    seed: str,
+    max_pages: int = CRAWL_MAX_PAGES,
+    max_depth: int = CRAWL_MAX_DEPTH,
+    concurrency: int = CRAWL_CONCURRENCY,
+) -> list[CrawledPage]:
+    '''Breadth-first crawl of seed's site, best-ranked pages first.
+
+    Each depth level fetches its highest-scoring unseen URLs concurrently
+    (robots.txt permitting, the seed included) until max_pages pages are
+    collected; pages that do not answer 2xx are skipped. Sitemap URLs join
+    the first level alongside the seed's own links.
+    '''
+    site = site_key(seed)
+    robots = await load_robots(seed)
+    semaphore = asyncio.Semaphore(concurrency)
+    seen = {normalize_url(seed)}
+    pages: list[CrawledPage] = []
+
+    async def visit(url: str, depth: int, score: float):
+        async with semaphore:
+            try:
+                html_content, text = await fetch_page(url, require_ok=True)
+                links = await get_parser_pool().links(html_content, url)
+            except UnsupportedContentError:
+                return []
+            except PageStatusError as error:
+                # error pages would be indexed as if they described the brand
+                print(f'URL: {url} - skipped, it answered {error.status}.')
+                return []
+            except Exception as error:
+                print(f'URL: {url} - crawl fetch failed: {error!r}')
+                return []
+        pages.append(CrawledPage(url, depth, score, text))
+        return links
+
+    started = time.perf_counter()
+    level = [(seed, float('inf'))]
+    if not robots.can_fetch(USER_AGENT, seed):
+        print(f'URL: {seed} - disallowed by robots.txt; crawling its sitemap only.')
+        level = []
+    candidates = {url: score_url(url) for url in await read_sitemaps(seed, robots)}
+    for depth in range(max_depth + 1):
+        results = await asyncio.gather(*(visit(url, depth, score) for url, score in level))
+        if depth == max_depth or len(pages) >= max_pages:
+            break
+        for links in results:
+            for url, anchor in links:
+                candidates[url] = max(candidates.get(url, -1.0), score_url(url, anchor))
+        level = []
+        for url, score in sorted(candidates.items(), key=lambda item: -item[1]):
+            key = normalize_url(url)
+            if len(level) >= max_pages - len(pages) or score < 0:
+                break
+            if key in seen or not is_crawlable(url, site) or not robots.can_fetch(USER_AGENT, url):
+                continue
+            seen.add(key)
+            level.append((url, score))
+        candidates = {}
+        if not level:
+            break
+    print(f'Crawled {len(pages)} pages of {site} in {time.perf_counter() - started:.2f}s.')
+    return sorted(pages, key=lambda page: (page.depth > 0, -page.score))[:max_pages]
+
+
+async def crawl_sites(seeds: list[str], **limits) -> list[CrawledPage]:
+    '''Crawls every seed concurrently; failed seeds contribute no pages.'''
+    results = await asyncio.gather(*(crawl_site(seed, **limits) for seed in seeds), return_exceptions=True)
+    pages = []
+    for seed, result in zip(seeds, results):
+        if isinstance(result, BaseException):
+            print(f'URL: {seed} - crawl failed: {result!r}')
+            continue
+        pages.extend(result)
+    return pages
@@ -0,0 +1,164 @@
+import hashlib
+import re
+import threading
+from dataclasses import dataclass
+
+from tokens import estimate_tokens
+from tools.parsing import get_parser_pool
+
+# Drops repeated blocks (promo banners, cookie notices, product tiles) from
+# scraped page text before it reaches the LLM.
+SHINGLE_WORDS = 2
+SIMHASH_BITS = 64
+NEAR_DUPLICATE_DISTANCE = 6  # max differing SimHash bits; unrelated blocks differ in ~18+
+MIN_SIMHASH_WORDS = 8  # shorter blocks are only matched exactly
+BANDS = NEAR_DUPLICATE_DISTANCE + 1
+BAND_BITS = SIMHASH_BITS // BANDS
+WORD = re.compile(r'\w+')
+DIGITS = re.compile(r'\d+')
+
+
+def _normalize(block: str) -> str:
+    # numbers are masked so tiles and banners differing only in prices or counts match
+    return DIGITS.sub('0', ' '.join(WORD.findall(block.lower())))
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(words: list[str], shingle_words: int = SHINGLE_WORDS) -> int:
+    '''64-bit SimHash over word shingles; similar texts differ in few bits.'''
+    count = max(1, len(words) - shingle_words + 1)
+    hashes = [
+        format(_hash64(' '.join(words[start:start + shingle_words])), f'0{SIMHASH_BITS}b')
+        for start in range(count)
+    ]
+    # a bit is set when most shingle hashes have it set (columns are most significant bit first)
+    bits = ''.join('1' if column.count('1') * 2 > count else '0' for column in zip(*hashes))
+    return int(bits, 2)
+
+
+@dataclass
+class DedupStats:
+    pages: int = 0
+    blocks: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+    def add(self, other: 'DedupStats'):
+        for field in self.__dataclass_fields__:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+
+class Deduplicator:
+    '''Removes blocks (lines of parse_html output) already seen in this or
+    an earlier page: exact matches by content hash, near matches by SimHash.
+
+    Fingerprints are indexed by BANDS bit bands; two fingerprints within
+    NEAR_DUPLICATE_DISTANCE bits share at least one band exactly, so only
+    those candidates are compared.
+    '''
+
+    def __init__(self, max_distance: int = NEAR_DUPLICATE_DISTANCE, min_words: int = MIN_SIMHASH_WORDS):
+        self.max_distance = max_distance
+        self.min_words = min_words
+        self.stats = DedupStats()
+        self._hashes: set[str] = set()
+        self._bands: dict[tuple[int, int], list[int]] = {}
+
+    def _is_near_duplicate(self, fingerprint: int) -> bool:
+        for band in range(BANDS):
+            key = (band, fingerprint >> band * BAND_BITS & (1 << BAND_BITS) - 1)
+            for other in self._bands.get(key, ()):
+                if (fingerprint ^ other).bit_count() <= self.max_distance:
+                    return True
+        return False
+
+    def _remember(self, fingerprint: int):
+        for band in range(BANDS):
+            key = (band, fingerprint >> band * BAND_BITS & (1 << BAND_BITS) - 1)
+            self._bands.setdefault(key, []).append(fingerprint)
+
+    def dedupe(self, text: str) -> str:
+        kept = []
+        self.stats.pages += 1
+        for block in text.split('\n'):
+            normalized = _normalize(block)
+            if not normalized:
+                continue
+            self.stats.blocks += 1
+            digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+            if digest in self._hashes:
+                self.stats.exact_duplicates += 1
+                continue
+            self._hashes.add(digest)
+            words = normalized.split()
+            if len(words) >= self.min_words:
+                fingerprint = simhash(words)
+                if self._is_near_duplicate(fingerprint):
+                    self.stats.near_duplicates += 1
+                    continue
+                self._remember(fingerprint)
+            kept.append(block)
+        deduped = '\n'.join(kept)
+        self.stats.bytes_in += len(text.encode('utf-8'))
+        self.stats.bytes_out += len(deduped.encode('utf-8'))
+        self.stats.tokens_in += estimate_tokens(text)
+        self.stats.tokens_out += estimate_tokens(deduped)
+        return deduped
+
+
+class DedupTotals:
+    '''Savings accumulated over every research call in this process.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = DedupStats()
+
+    def record(self, stats: DedupStats):
+        with self._lock:
+            self.stats.add(stats)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                'pages': self.stats.pages,
+                'exact_duplicates': self.stats.exact_duplicates,
+                'near_duplicates': self.stats.near_duplicates,
+                'bytes_saved': self.stats.bytes_saved,
+                'tokens_saved': self.stats.tokens_saved,
+            }
+
+
+dedup_totals = DedupTotals()
+
+
+def dedupe_texts(texts: list[str]) -> tuple[list[str], DedupStats]:
+    '''Deduplicates texts in order, within and across pages.'''
+    deduplicator = Deduplicator()
+    return [deduplicator.dedupe(text) for text in texts], deduplicator.stats
+
+
+async def dedupe_pages(texts: list[str]) -> list[str]:
+    '''Runs dedupe_texts in the parser pool and records the savings.'''
+    deduped, stats = await get_parser_pool().run(dedupe_texts, texts)
+    dedup_totals.record(stats)
+    if stats.blocks:
+        print(
+            f'Dedup: dropped {stats.exact_duplicates} exact and {stats.near_duplicates} near-duplicate '
+            f'blocks of {stats.blocks}, saving {stats.bytes_saved} bytes (~{stats.tokens_saved} tokens).'
+        )
+    return deduped
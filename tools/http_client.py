@@ -0,0 +1,125 @@
+import asyncio
+import contextlib
+import random
+
+import aiohttp
+
+# Shared HTTP client used by every fetcher (research tool, crawlers, ...).
+MAX_CONNECTIONS = 64
+MAX_CONNECTIONS_PER_HOST = 6
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+KEEPALIVE_TIMEOUT = 30
+DNS_CACHE_TTL = 300
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; MarketingResearchBot/1.0)',
+    'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.5',
+}
+
+
+class HttpClient:
+    '''Long-lived aiohttp session with pooled keep-alive connections.
+
+    The connector caps open connections globally and per host, so a fan-out
+    over many URLs of the same site queues instead of flooding it.
+    Connection errors, timeouts and retryable statuses are retried with
+    exponential backoff (honouring Retry-After when the server sends it).
+    '''
+
+    def __init__(
+        self,
+        max_connections: int = MAX_CONNECTIONS,
+        max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        headers: dict | None = None,
+    ):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self._session = None
+        self._loop = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # A session is bound to the loop it was created on, so a new
+        # asyncio.run() (e.g. a second CLI invocation) gets a fresh one.
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            timeout = aiohttp.ClientTimeout(
+                sock_connect=self.connect_timeout,
+                sock_read=self.read_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=timeout, headers=self.headers
+            )
+            self._loop = loop
+        return self._session
+
+    def _backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+        delay = self.backoff_base * (2 ** attempt)
+        return min(delay + random.uniform(0, self.backoff_base), BACKOFF_MAX)
+
+    @contextlib.asynccontextmanager
+    async def get(self, url: str, **kwargs):
+        '''Async context manager yielding the response of a retried GET.'''
+        session = self._get_session()
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                response = await session.get(url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    break
+                retry_after = response.headers.get('Retry-After')
+                response.release()
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+        try:
+            yield response
+        finally:
+            response.release()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+_client = None
+
+
+def get_http_client() -> HttpClient:
+    '''Returns the process-wide shared client.'''
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
+
+
+async def close_http_client():
+    if _client is not None:
+        await _client.close()
@@ -0,0 +1,69 @@
+import collections
+import statistics
+import threading
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class FetchRecord:
+    url: str
+    source: str  # 'network', 'cache' or 'revalidated'
+    status: int | None
+    fetch_time: float
+    parse_time: float
+    bytes: int
+
+
+# fetches kept for the medians; counts and totals cover every fetch
+MAX_RECORDS = 1000
+
+
+class FetchMetrics:
+    '''Per-URL fetch and parse timings collected by the web tools.'''
+
+    def __init__(self, max_records: int = MAX_RECORDS):
+        self._lock = threading.Lock()
+        self.records: collections.deque[FetchRecord] = collections.deque(maxlen=max_records)
+        self._totals = self._new_totals()
+
+    @staticmethod
+    def _new_totals() -> dict:
+        return {'urls': 0, 'network': 0, 'fetch_time_total': 0.0, 'parse_time_total': 0.0}
+
+    def record(self, url: str, source: str, status: int | None = None,
+               fetch_time: float = 0.0, parse_time: float = 0.0, bytes: int = 0):
+        with self._lock:
+            self.records.append(FetchRecord(url, source, status, fetch_time, parse_time, bytes))
+            self._totals['urls'] += 1
+            if source == 'network':
+                self._totals['network'] += 1
+                self._totals['fetch_time_total'] += fetch_time
+            self._totals['parse_time_total'] += parse_time
+
+    def summary(self) -> dict:
+        '''Counts and totals since the last reset; medians over the last MAX_RECORDS fetches.'''
+        with self._lock:
+            totals = dict(self._totals)
+            fetch_times = [r.fetch_time for r in self.records if r.source == 'network']
+            parse_times = [r.parse_time for r in self.records if r.parse_time]
+        return {
+            'urls': totals['urls'],
+            'network': totals['network'],
+            'cached': totals['urls'] - totals['network'],
+            'fetch_time_total': totals['fetch_time_total'],
+            'fetch_time_median': statistics.median(fetch_times) if fetch_times else 0.0,
+            'parse_time_total': totals['parse_time_total'],
+            'parse_time_median': statistics.median(parse_times) if parse_times else 0.0,
+        }
+
+    def as_dicts(self) -> list[dict]:
+        with self._lock:
+            return [asdict(r) for r in self.records]
+
+    def reset(self):
+        with self._lock:
+            self.records.clear()
+            self._totals = self._new_totals()
+
+
+fetch_metrics = FetchMetrics()
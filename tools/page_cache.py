@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Disk-backed cache of fetched pages, shared by every run of the graph.
+CACHE_PATH = os.path.join('.cache', 'pages.sqlite')
+CACHE_TTL = 24 * 60 * 60  # seconds before an entry must be revalidated
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    '''Canonical cache key: lower-cased scheme/host, no default port,
+    no fragment and sorted query parameters.'''
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+    path = parts.path or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def site_key(url: str) -> str:
+    '''Host (and non-default port) without a leading www., identifying which site a page belongs to.'''
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    host = host[4:] if host.startswith('www.') else host
+    if parts.port and parts.port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f'{host}:{parts.port}'
+    return host
+
+
+@dataclass
+class CachedPage:
+    url: str
+    body: str
+    text: str
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+    parser: str = ''  # version of the parser that produced text
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class PageCache:
+    '''SQLite page store with TTL freshness and size-bounded LRU eviction.
+
+    Stores the raw response body, the parsed text and the validators
+    (ETag / Last-Modified) so stale entries can be revalidated with a
+    conditional GET instead of being downloaded and parsed again.
+    '''
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                text TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                parser TEXT NOT NULL DEFAULT ''
+            )'''
+        )
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(pages)')}
+        if 'parser' not in columns:
+            # caches written before texts were versioned; their texts count as outdated
+            self._conn.execute("ALTER TABLE pages ADD COLUMN parser TEXT NOT NULL DEFAULT ''")
+        self._conn.execute('CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)')
+        self._conn.commit()
+
+    def get(self, url: str) -> CachedPage | None:
+        key = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT url, body, text, etag, last_modified, fetched_at, parser FROM pages WHERE url = ?',
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE pages SET accessed_at = ? WHERE url = ?', (time.time(), key))
+            self._conn.commit()
+        return CachedPage(*row)
+
+    def put(self, url: str, body: str, text: str, etag: str | None = None, last_modified: str | None = None,
+            parser: str = ''):
+        key = normalize_url(url)
+        now = time.time()
+        size = len(body.encode('utf-8')) + len(text.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, body, text, etag, last_modified, now, now, size, parser),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def revalidated(self, url: str, etag: str | None = None, last_modified: str | None = None):
+        '''Marks an entry fresh again after a 304 Not Modified.'''
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                '''UPDATE pages SET fetched_at = ?, accessed_at = ?,
+                   etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified)
+                   WHERE url = ?''',
+                (now, now, etag, last_modified, normalize_url(url)),
+            )
+            self._conn.commit()
+
+    def reparsed(self, url: str, body: str, text: str, parser: str):
+        '''Replaces an entry's text with one from another parser, keeping its freshness.'''
+        size = len(body.encode('utf-8')) + len(text.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                'UPDATE pages SET text = ?, size = ?, parser = ? WHERE url = ?',
+                (text, size, parser, normalize_url(url)),
+            )
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute('SELECT url, size FROM pages ORDER BY accessed_at').fetchall()
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM pages WHERE url = ?', (url,))
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM pages')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+
+
+def get_page_cache() -> PageCache:
+    '''Returns the process-wide page cache, opened on first use.'''
+    global _cache
+    if _cache is None:
+        _cache = PageCache()
+    return _cache
+
+
+def set_page_cache(cache: PageCache | None):
+    '''Replaces the shared cache, e.g. with one using a different path or TTL.'''
+    global _cache
+    _cache = cache
@@ -0,0 +1,184 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+# Worker pool for CPU-bound HTML parsing, kept off the event loop.
+PARSER_POOL_KIND = 'process'  # 'process' or 'thread'
+PARSER_WORKERS = os.cpu_count() or 1
+
+
+# PARSING HTML
+# bump whenever parse_html's output changes, so cached texts are parsed again
+PARSER_VERSION = 2
+MAX_TEXT_CHARS = 8000
+SKIPPED_TAGS = {'nav', 'footer', 'aside', 'script', 'style', 'img', 'header', 'noscript', 'svg', 'template'}
+FEED_CHUNK_CHARS = 16 * 1024
+# elements that start a new line of text, so blocks stay separable (see tools.dedup)
+BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'tr', 'table', 'br', 'hr',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'form', 'dd', 'dt', 'figcaption',
+}
+
+
+class TextExtractor(HTMLParser):
+    '''Incremental visible-text extractor.
+
+    Text inside SKIPPED_TAGS is dropped and BLOCK_TAGS start a new line.
+    Once max_chars of normalized text
+    have been collected the extractor is done and further input is ignored,
+    so the rest of a large document is never tokenized.
+    '''
+
+    def __init__(self, max_chars: int = MAX_TEXT_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.done = False
+        self._skip_depth = 0
+        self._pieces = []
+        self._length = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS and tag != 'img':
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._pieces.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and tag != 'img' and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in BLOCK_TAGS:
+            self._pieces.append('\n')
+
+    def handle_data(self, data):
+        if self._skip_depth or self.done:
+            return
+        self._pieces.append(data)
+        self._length += len(' '.join(data.split()))
+        if self._length >= self.max_chars:
+            self.done = True
+
+    def feed(self, data: str):
+        if not self.done:
+            super().feed(data)
+
+    def get_text(self) -> str:
+        lines = (' '.join(line.split()) for line in ''.join(self._pieces).split('\n'))
+        return '\n'.join(line for line in lines if line)[:self.max_chars]
+
+
+def parse_html(html_content: str, max_chars: int = MAX_TEXT_CHARS) -> str:
+    extractor = TextExtractor(max_chars)
+    for start in range(0, len(html_content), FEED_CHUNK_CHARS):
+        extractor.feed(html_content[start:start + FEED_CHUNK_CHARS])
+        if extractor.done:
+            break
+    else:
+        extractor.close()
+    return extractor.get_text()
+
+
+class LinkExtractor(HTMLParser):
+    '''Collects (absolute URL, anchor text) for every http(s) <a href>.'''
+
+    def __init__(self, base_url: str):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.links: list[tuple[str, str]] = []
+        self._href = None
+        self._anchor = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'base':
+            self.base_url = urljoin(self.base_url, dict(attrs).get('href') or '')
+        elif tag == 'a':
+            self._close_anchor()
+            href = (dict(attrs).get('href') or '').strip()
+            if href and not href.startswith(('#', 'mailto:', 'tel:', 'javascript:')):
+                self._href = urldefrag(urljoin(self.base_url, href))[0]
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._close_anchor()
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._anchor.append(data)
+
+    def _close_anchor(self):
+        if self._href is not None and urlsplit(self._href).scheme in ('http', 'https'):
+            self.links.append((self._href, ' '.join(''.join(self._anchor).split())))
+        self._href = None
+        self._anchor = []
+
+
+def extract_links(html_content: str, base_url: str) -> list[tuple[str, str]]:
+    extractor = LinkExtractor(base_url)
+    extractor.feed(html_content)
+    extractor.close()
+    extractor._close_anchor()
+    return extractor.links
+
+
+class ParserPool:
+    '''Runs parse_html in a process (or thread) pool so large pages do not
+    stall other fetches or graph nodes sharing the event loop.'''
+
+    def __init__(self, kind: str = PARSER_POOL_KIND, max_workers: int = PARSER_WORKERS):
+        if kind not in ('process', 'thread'):
+            raise ValueError(f'Unknown parser pool kind: {kind}')
+        self.kind = kind
+        self.max_workers = max_workers
+        self._executor = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='parse_html'
+                )
+        return self._executor
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    async def parse(self, html_content: str, max_chars: int = MAX_TEXT_CHARS) -> str:
+        return await self.run(parse_html, html_content, max_chars)
+
+    async def links(self, html_content: str, base_url: str) -> list[tuple[str, str]]:
+        return await self.run(extract_links, html_content, base_url)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_pool = None
+
+
+def get_parser_pool() -> ParserPool:
+    '''Returns the process-wide parser pool, started lazily.'''
+    global _pool
+    if _pool is None:
+        _pool = ParserPool()
+    return _pool
+
+
+def configure_parser_pool(kind: str = PARSER_POOL_KIND, max_workers: int = PARSER_WORKERS) -> ParserPool:
+    '''Replaces the shared pool, e.g. to change the worker count.'''
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = ParserPool(kind, max_workers)
+    return _pool
+
+
+def shutdown_parser_pool():
+    '''Stops the shared pool's workers; the next parse starts them again.'''
+    if _pool is not None:
+        _pool.shutdown()
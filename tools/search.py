@@ -0,0 +1,31 @@
+from langchain_community.tools.tavily_search import TavilySearchResults
+
+from rate_limit import get_rate_limiter, is_rate_limited
+
+SEARCH_ROUTE = 'tavily:search'
+
+
+class RateLimitedTavilySearch(TavilySearchResults):
+    '''Tavily search that waits for the shared 'tavily:search' budget.
+
+    Tavily's tool returns errors as strings, so 429s are detected in the
+    result rather than caught.
+    '''
+
+    def _run(self, query: str, run_manager=None):
+        limiter = get_rate_limiter().route(SEARCH_ROUTE)
+        if limiter:
+            limiter.acquire_sync()
+        result = super()._run(query, run_manager)
+        if limiter and isinstance(result[0], str) and is_rate_limited(Exception(result[0])):
+            limiter.penalize()
+        return result
+
+    async def _arun(self, query: str, run_manager=None):
+        limiter = get_rate_limiter().route(SEARCH_ROUTE)
+        if limiter:
+            await limiter.acquire()
+        result = await super()._arun(query, run_manager)
+        if limiter and isinstance(result[0], str) and is_rate_limited(Exception(result[0])):
+            limiter.penalize()
+        return result
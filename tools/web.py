@@ -1,42 +1,162 @@
 import asyncio
+import codecs
 import json
 import sys
+import time
 
-import aiohttp
-from bs4 import BeautifulSoup
 from langchain.tools import tool
 from pydantic import BaseModel, Field
 
-# PARSING HTML
-def parse_html(html_content: str) -> str:
-    soup = BeautifulSoup(html_content, 'html.parser')
-    for tag in ["nav", "footer", "aside", "script", "style", "img", "header"]:
-        for match in soup.find_all(tag):
-            match.decompose()
-
-    text_content = soup.get_text()
-    text_content = ' '.join(text_content.split())
-    return text_content[:8000]
+from tools.dedup import dedupe_pages
+from tools.http_client import close_http_client, get_http_client
+from tools.metrics import fetch_metrics
+from tools.page_cache import CachedPage, PageCache, get_page_cache
+from tools.parsing import MAX_TEXT_CHARS, PARSER_VERSION, get_parser_pool, parse_html, shutdown_parser_pool
+from retrieval import get_site_indexes
 
 # FETCHING WEBPAGES
-async def get_webpage_content(url: str) -> str:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            html_content = await response.text()
+HTML_CONTENT_TYPES = {'text/html', 'application/xhtml+xml', 'text/plain'}
+MAX_BODY_BYTES = 2 * 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+# pages are parsed in full for the retrieval index; agents see MAX_TEXT_CHARS per page
+FULL_TEXT_CHARS = 200_000
+# cached texts are reused only when they were parsed the same way
+TEXT_VERSION = f'{PARSER_VERSION}:{FULL_TEXT_CHARS}'
+
+
+class UnsupportedContentError(ValueError):
+    '''Raised when a URL does not serve HTML, so its body is never read.'''
+
+
+class PageStatusError(ValueError):
+    '''Raised by fetch_page(require_ok=True) for a non-2xx response, e.g. a 404 page.'''
+
+    def __init__(self, url: str, status: int):
+        super().__init__(f'{url} answered {status}')
+        self.status = status
+
+
+async def read_html(response, max_bytes: int = MAX_BODY_BYTES) -> str:
+    '''Streams and incrementally decodes at most max_bytes of an HTML body.'''
+    content_type = response.content_type
+    if content_type not in HTML_CONTENT_TYPES:
+        raise UnsupportedContentError(f'{response.url} serves {content_type}, not HTML')
+    if response.content_length is not None and response.content_length > max_bytes:
+        print(f'URL: {response.url} - body of {response.content_length} bytes truncated to {max_bytes}.')
+
+    try:
+        decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    parts = []
+    received = 0
+    async for chunk in response.content.iter_chunked(READ_CHUNK_BYTES):
+        chunk = chunk[:max_bytes - received]
+        received += len(chunk)
+        parts.append(decoder.decode(chunk))
+        if received >= max_bytes:
+            break
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts)
+
 
-    text_content = parse_html(html_content)
-    print(f'URL: {url} - getched successfully.')
-    return text_content
+async def cached_text(cache: PageCache, page: CachedPage) -> str:
+    '''The cached page's text, parsed again from its body if another TEXT_VERSION wrote it.'''
+    if page.parser == TEXT_VERSION:
+        return page.text
+    text = await get_parser_pool().parse(page.body, FULL_TEXT_CHARS)
+    await asyncio.to_thread(cache.reparsed, page.url, page.body, text, TEXT_VERSION)
+    return text
+
+
+async def fetch_page(url: str, require_ok: bool = False) -> tuple[str, str]:
+    '''Returns (html, text) of url, from the page cache when possible.
+
+    With require_ok, a non-2xx response raises PageStatusError before its body is read.
+    '''
+    cache = get_page_cache()
+    # cache reads and writes (bodies up to MAX_BODY_BYTES) go through sqlite, off the event loop
+    cached = await asyncio.to_thread(cache.get, url)
+    if cached is not None and cached.is_fresh(cache.ttl):
+        fetch_metrics.record(url, 'cache')
+        print(f'URL: {url} - served from cache.')
+        return cached.body, await cached_text(cache, cached)
+
+    started = time.perf_counter()
+    headers = cached.conditional_headers() if cached is not None else {}
+    async with get_http_client().get(url, headers=headers) as response:
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status == 304 and cached is not None:
+            await asyncio.to_thread(cache.revalidated, url, etag, last_modified)
+            fetch_metrics.record(url, 'revalidated', 304, time.perf_counter() - started)
+            print(f'URL: {url} - not modified, served from cache.')
+            return cached.body, await cached_text(cache, cached)
+        if require_ok and not 200 <= response.status < 300:
+            fetch_metrics.record(url, 'network', response.status, time.perf_counter() - started)
+            raise PageStatusError(url, response.status)
+        html_content = await read_html(response)
+    fetch_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    text_content = await get_parser_pool().parse(html_content, FULL_TEXT_CHARS)
+    parse_time = time.perf_counter() - started
+
+    if response.status == 200:
+        await asyncio.to_thread(cache.put, url, html_content, text_content, etag, last_modified, TEXT_VERSION)
+    fetch_metrics.record(
+        url, 'network', response.status, fetch_time, parse_time, len(html_content)
+    )
+    print(f'URL: {url} - getched successfully (fetch {fetch_time:.2f}s, parse {parse_time:.2f}s).')
+    return html_content, text_content
+
+
+async def get_webpage_content(url: str) -> str:
+    return (await fetch_page(url))[1][:MAX_TEXT_CHARS]
 
 
 # Tool Creation
 class ResearchInput(BaseModel):
     research_urls: list[str] = Field(description='Must be valid list of URLs.')
+    crawl: bool = Field(
+        default=False,
+        description='Also crawl each site (sitemap and same-site links) for its about, product and collection pages.',
+    )
 
 
 @tool('research', args_schema=ResearchInput)
-async def research(research_urls: list[str]) -> str:
+async def research(research_urls: list[str], crawl: bool = False) -> str:
     '''Get content of provided URLs for research purpose'''
-    tasks = [asyncio.create_task(get_webpage_content(url)) for url in research_urls]
-    contents = await asyncio.gather(*tasks, return_exceptions=True)
+    if crawl:
+        # imported here: the crawler builds on fetch_page above
+        from tools.crawler import CRAWL_PAGE_CHARS, crawl_sites
+        pages = await crawl_sites(research_urls)
+        # seeds come first, so shared boilerplate is kept once, on the seed page
+        texts = await dedupe_pages([page.text for page in pages])
+        for page, text in zip(pages, texts):
+            get_site_indexes().add(page.url, text)
+        return json.dumps([
+            f'Source: {page.url}\n{text[:MAX_TEXT_CHARS if page.depth == 0 else CRAWL_PAGE_CHARS]}'
+            for page, text in zip(pages, texts)
+        ])
+
+    tasks = [asyncio.create_task(fetch_page(url)) for url in research_urls]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    fetched = [(url, result[1]) for url, result in zip(research_urls, results) if not isinstance(result, BaseException)]
+    texts = dict(zip((url for url, _ in fetched), await dedupe_pages([text for _, text in fetched])))
+    contents = []
+    for url, result in zip(research_urls, results):
+        if isinstance(result, BaseException):
+            contents.append(f'Could not fetch {url}: {result!r}')
+            continue
+        # the full page is indexed for retrieval; the agent gets the first MAX_TEXT_CHARS
+        get_site_indexes().add(url, texts[url])
+        contents.append(texts[url][:MAX_TEXT_CHARS])
     return json.dumps(contents)
+
+
+async def close_web_clients():
+    '''Closes the shared HTTP session and parser pool; entry points call it on teardown.'''
+    await close_http_client()
+    await asyncio.to_thread(shutdown_parser_pool)